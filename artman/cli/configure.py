@@ -23,14 +23,10 @@ import os
 
 import six
 
-from ruamel import yaml
-import stringcase
-import yaml
-
-from artman.config.proto.user_config_pb2 import UserConfig, LocalConfig, GitHubConfig
+# The config protos and the YAML library are imported where they are used,
+# since importing `artman.cli` loads this module for every artman command.
 from artman.utils.logger import logger
 from artman.utils.logger import setup_logging
-from google.protobuf.json_format import MessageToJson
 
 __all__ = ('configure',)
 
@@ -41,6 +37,7 @@ def configure(log_level=logging.INFO):
     Returns:
         int: An exit status.
     """
+    from artman.config.proto.user_config_pb2 import UserConfig
     user_config = UserConfig()
 
     # Walk the user through basic configuration.
@@ -69,6 +66,7 @@ def _configure_local_config():
     Returns:
         LocalConfig: The new artman local config settings.
     """
+    from artman.config.proto.user_config_pb2 import LocalConfig
     answer = LocalConfig()
 
     # Ask the user for a local toolkit location.
@@ -85,6 +83,9 @@ def _configure_local_config():
 
 
 def _write_pb_to_yaml(pb, output):
+    from google.protobuf.json_format import MessageToJson
+    import yaml
+
     # Add yaml representer so that yaml dump can dump OrderedDict. The code
     # is coming from https://stackoverflow.com/questions/16782112.
     yaml.add_representer(OrderedDict, _represent_ordereddict)
@@ -95,6 +96,7 @@ def _write_pb_to_yaml(pb, output):
 
 
 def _represent_ordereddict(dumper, data):
+    import yaml
     value = []
     for item_key, item_value in data.items():
         node_key = dumper.represent_data(item_key)
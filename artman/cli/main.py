@@ -23,31 +23,52 @@
 from __future__ import absolute_import
 from logging import INFO
 import argparse
-from distutils.dir_util import copy_tree
+import collections
+from concurrent import futures
+import fnmatch
 import io
+import multiprocessing
 import os
 import pprint
+import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import traceback
 
-import pkg_resources
-from ruamel import yaml
-from taskflow import engines
+try:
+    from importlib import metadata
+except ImportError:  # Python < 3.8
+    metadata = None
 
-from artman.config import converter, loader
-from artman.config.proto.config_pb2 import Artifact, Config
-from artman.config.proto.user_config_pb2 import UserConfig
+# taskflow, the pipelines and tasks, the config protos and the YAML parsers
+# are imported where they are used, so that e.g. `artman --version` and
+# `artman docker stop` do not pay for loading them.
 from artman.cli import support
-from artman.pipelines import pipeline_factory
-from artman.utils import config_util
+from artman.utils import cache_utils
+from artman.utils import file_utils
+from artman.utils import generator_daemon
+from artman.utils import proto_index
+from artman.utils import task_utils
+from artman.utils import trace_utils
 from artman.utils.logger import logger, setup_logging
 
-VERSION = pkg_resources.get_distribution('googleapis-artman').version
+
+def _version():
+    if metadata:
+        return metadata.version('googleapis-artman')
+    import pkg_resources
+    return pkg_resources.get_distribution('googleapis-artman').version
+
+
+VERSION = _version()
 ARTMAN_DOCKER_IMAGE = 'googleapis/artman:%s' % VERSION
 RUNNING_IN_ARTMAN_DOCKER_TOKEN = 'RUNNING_IN_ARTMAN_DOCKER'
 DEFAULT_OUTPUT_DIR = './artman-genfiles'
+WARM_CONTAINER_LABEL = 'artman.warm-container'
+# The root of the versioned googleapis repo inside Artman Docker image.
+VERSIONED_GOOGLEAPIS_DIR = '/googleapis'
 
 def main(*args):
     """Main method of artman."""
@@ -58,23 +79,53 @@ def main(*args):
 
     # Get to a normalized set of arguments.
     flags = parse_args(*args)
-    user_config = loader.read_user_config(flags.user_config)
-    _adjust_root_dir(flags.root_dir)
+    # Outside of Docker, the artman run inside the container writes the
+    # trace.
+    trace = flags.trace_out and flags.local
+    if trace:
+        trace_utils.enable()
+    try:
+        _main(flags)
+    finally:
+        proto_index.save()
+        if trace:
+            trace_utils.write(flags.trace_out)
+            logger.info('Wrote timing trace to %s.' % flags.trace_out)
+
+
+def _main(flags):
+    if flags.subcommand == 'docker':
+        _stop_warm_containers()
+        return
+    if flags.subcommand == 'daemon':
+        stopped = generator_daemon.stop_all(flags.cache_dir)
+        logger.info('Stopped %d gapic-generator daemon(s).' % stopped)
+        return
+    from artman.config import loader
+    with trace_utils.span('read user config', 'config'):
+        user_config = loader.read_user_config(flags.user_config)
+    if flags.local and flags.nailgun_jar:
+        generator_daemon.enable(flags.nailgun_jar, flags.cache_dir)
+    if flags.local and flags.cache_dir:
+        proto_index.enable(flags.cache_dir)
+    flags.common_proto_root = _common_proto_root(flags.root_dir)
+    if flags.subcommand == 'generate-all':
+        _generate_all(flags, user_config)
+        return
+    if ',' in flags.artifact_name:
+        _generate_artifacts(flags, user_config)
+        return
     pipeline_name, pipeline_kwargs = normalize_flags(flags, user_config)
 
     if flags.local:
+        snapshot = _snapshot_owned_directories(flags, pipeline_kwargs)
         try:
-            pipeline = pipeline_factory.make_pipeline(pipeline_name,
-                                                      **pipeline_kwargs)
-            # Hardcoded to run pipeline in serial engine, though not necessarily.
-            engine = engines.load(
-                pipeline.flow, engine='serial', store=pipeline.kwargs)
-            engine.run()
+            _run_pipeline(flags, pipeline_name, pipeline_kwargs)
         except:
             logger.error(traceback.format_exc())
             sys.exit(32)
         finally:
-            _change_owner(flags, pipeline_name, pipeline_kwargs)
+            _change_owner(flags, pipeline_name, pipeline_kwargs, snapshot)
     else:
         support.check_docker_requirements(flags.image)
         # Note: artman currently won't work if input directory doesn't contain
@@ -83,28 +134,260 @@ def main(*args):
         _run_artman_in_docker(flags)
 
 
-def _adjust_root_dir(root_dir):
-    """Adjust input directory to use versioned common config and/or protos.
+def _run_pipeline(flags, pipeline_name, pipeline_kwargs):
+    """Build the named pipeline and run it with the engine given in flags.
+
+    With `--scratch-dir`, the intermediate files of the run are written to
+    a fresh directory under it, which is removed once the run succeeds.
+
+    Returns:
+        dict: The results of the pipeline tasks, by name.
+    """
+    scratch_dir = None
+    if getattr(flags, 'scratch_dir', None):
+        scratch_root = os.path.abspath(os.path.expanduser(flags.scratch_dir))
+        file_utils.makedirs(scratch_root)
+        scratch_dir = tempfile.mkdtemp(prefix='run-', dir=scratch_root)
+        pipeline_kwargs = dict(pipeline_kwargs, scratch_dir=scratch_dir)
+    from taskflow import engines
+    from artman.pipelines import pipeline_factory
+    with trace_utils.span('build ' + pipeline_name, 'pipeline'):
+        pipeline = pipeline_factory.make_pipeline(pipeline_name,
+                                                  **pipeline_kwargs)
+    engine_options = {}
+    if flags.engine == 'parallel' and flags.jobs:
+        engine_options['max_workers'] = flags.jobs
+    engine = engines.load(
+        pipeline.flow, engine=flags.engine, store=pipeline.kwargs,
+        **engine_options)
+    try:
+        with trace_utils.span('run ' + pipeline_name, 'pipeline'):
+            engine.run()
+    except Exception:
+        if scratch_dir:
+            logger.info('Intermediate files are kept in %s.' % scratch_dir)
+        raise
+    if scratch_dir:
+        shutil.rmtree(scratch_dir)
+    # The values provided by the tasks, e.g. the generated code directories.
+    return {name: value for name, value in engine.storage.fetch_all().items()
+            if name not in pipeline.kwargs}
+
+
+def _generate_artifacts(flags, user_config):
+    """Generate several artifacts of one artman config yaml.
+
+    The artifacts are generated one after another in this process, like the
+    artifacts of one API with `generate-all`. Each runs its own pipeline,
+    but the protos are indexed once, and the artifacts whose protoc versions
+    agree reuse the descriptor set compiled for the first one through the
+    cache, see `_generate_all`.
+    """
+    from artman.config import loader
+    root_dir = os.path.abspath(flags.root_dir or os.getcwd())
+    config = os.path.join(root_dir, flags.config)
+    wanted = flags.artifact_name.split(',')
+    if os.path.isfile(config):
+        unknown = set(wanted) - set(loader.list_artifact_names(config))
+        if unknown:
+            logger.error('Artifacts %s are not configured in `%s`.'
+                         % (', '.join(sorted(unknown)), config))
+            sys.exit(96)
+    flags.configs = [config]
+    flags.artifacts = flags.artifact_name
+    _generate_all(flags, user_config)
+
+
+def _generate_all(flags, user_config):
+    """Generate every matching artifact of many artman config yamls.
+
+    All pipelines run in this process. Artifacts of the same API write the
+    same intermediate files (e.g. the descriptor set), so they run one after
+    another; different APIs run concurrently on a pool of `--workers`
+    threads. A per-artifact summary is logged at the end.
+
+    Artifacts share their descriptor sets and transformed Python protos
+    through the cache directory. When caching is disabled, a cache is kept
+    for this run only, so that they are still shared.
+    """
+    from google.protobuf import json_format
+    import yaml
+
+    from artman.config import loader
+    flags.root_dir = os.path.abspath(flags.root_dir or os.getcwd())
+    flags.output_dir = os.path.abspath(flags.output_dir)
+    configs = [os.path.join(flags.root_dir, config)
+               for config in flags.configs]
+    if not configs:
+        configs = _find_artman_configs(flags.root_dir)
+    if not configs:
+        logger.error('No artman config yaml found under `%s`.'
+                     % flags.root_dir)
+        sys.exit(96)
+
+    if not flags.local:
+        support.check_docker_requirements(flags.image)
+        flags.config = configs[0]
+        logger.info('Running artman command in a Docker instance.')
+        _run_artman_in_docker(flags)
+        return
+
+    run_cache_dir = None
+    if not getattr(flags, 'cache_dir', None):
+        run_cache_dir = tempfile.mkdtemp(prefix='artman-run-cache-')
+        flags.cache_dir = run_cache_dir
+        logger.info('Caching is disabled; sharing intermediate files between '
+                    'the artifacts of this run through %s.' % run_cache_dir)
+
+    wanted = set(flags.artifacts.split(',')) if flags.artifacts else None
+    results = []
+    groups = collections.OrderedDict()
+    for config in configs:
+        # Each config is parsed once for all its artifacts. If one of them
+        # is invalid, every artifact is loaded on its own, so that only the
+        # invalid ones fail. A config which cannot be parsed at all fails
+        # on its own, without stopping the others.
+        try:
+            try:
+                artifact_configs = loader.load_all_artifact_configs(
+                    config, getattr(flags, 'aspect', None))
+                artifact_names = list(artifact_configs)
+            except ValueError:
+                artifact_configs = {}
+                artifact_names = loader.list_artifact_names(config)
+        except (ValueError, yaml.YAMLError, json_format.ParseError):
+            logger.error(traceback.format_exc())
+            results.append(
+                (os.path.relpath(config, flags.root_dir), False, 0.0))
+            continue
+        for artifact_name in artifact_names:
+            if wanted and artifact_name not in wanted:
+                continue
+            job_name = '%s@%s' % (
+                artifact_name, os.path.relpath(config, flags.root_dir))
+            job_flags = argparse.Namespace(**vars(flags))
+            job_flags.config = config
+            job_flags.artifact_name = artifact_name
+            job_flags.aspect = getattr(flags, 'aspect', None)
+            job_flags.artifact_config = artifact_configs.get(artifact_name)
+            try:
+                pipeline_name, pipeline_kwargs = normalize_flags(
+                    job_flags, user_config)
+            except (Exception, SystemExit):
+                logger.error('Failed to load %s.' % job_name)
+                results.append((job_name, False, 0.0))
+                continue
+            api_full_name = task_utils.api_full_name(
+                pipeline_kwargs['api_name'], pipeline_kwargs['api_version'],
+                pipeline_kwargs['organization_name'])
+            groups.setdefault(api_full_name, []).append(
+                (job_name, job_flags, pipeline_name, pipeline_kwargs))
+
+    workers = getattr(flags, 'workers', None) or multiprocessing.cpu_count()
+    try:
+        with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for group_results in executor.map(_run_jobs, groups.values()):
+                results.extend(group_results)
+    finally:
+        if run_cache_dir:
+            shutil.rmtree(run_cache_dir, ignore_errors=True)
+
+    logger.info('================ Generation summary ================')
+    for job_name, succeeded, elapsed in results:
+        if succeeded:
+            logger.success('SUCCESS %s (%.1fs)' % (job_name, elapsed))
+        else:
+            logger.error('FAILURE %s (%.1fs)' % (job_name, elapsed))
+    if not all(succeeded for _, succeeded, _ in results):
+        sys.exit(32)
+
+
+def _find_artman_configs(root_dir):
+    """Return the `artman_*.yaml` files under `root_dir`, skipping hidden
+    directories like a recursive glob does."""
+    # `glob` only supports `**` from Python 3.5 on.
+    configs = []
+    for root, dirs, files in os.walk(root_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        configs.extend(os.path.join(root, name)
+                       for name in fnmatch.filter(files, 'artman_*.yaml'))
+    return sorted(configs)
+
+
+def _run_jobs(jobs):
+    """Run the given pipelines one after another.
+
+    Returns:
+        list: (job name, whether it succeeded, seconds taken) per job.
+    """
+    results = []
+    for job_name, job_flags, pipeline_name, pipeline_kwargs in jobs:
+        logger.info('Start artifact generation for %s.' % job_name)
+        start = time.time()
+        succeeded = True
+        snapshot = _snapshot_owned_directories(job_flags, pipeline_kwargs)
+        try:
+            _run_pipeline(job_flags, pipeline_name, pipeline_kwargs)
+        except Exception:
+            logger.error(traceback.format_exc())
+            succeeded = False
+        finally:
+            _change_owner(job_flags, pipeline_name, pipeline_kwargs, snapshot)
+        results.append((job_name, succeeded, time.time() - start))
+    return results
+
+
+def _common_proto_root(root_dir):
+    """Provide the versioned common protos missing from the input directory.
 
     Some common protos will be needed during protoc compilation, but are not
     provided by users in some cases. When such shared proto directories are
-    not provided, we copy and use the versioned ones.
+    not provided, the versioned ones are linked into a separate include root
+    outside the input directory, which is added to the import proto path.
+
+    Returns:
+        str: The include root, or None if nothing is missing.
     """
-    if os.getenv(RUNNING_IN_ARTMAN_DOCKER_TOKEN):
+    if not os.getenv(RUNNING_IN_ARTMAN_DOCKER_TOKEN):
         # Only doing this when running inside Docker container
-        common_proto_dirs = [
-            'google/api',
-            'google/iam/v1',
-            'google/longrunning',
-            'google/rpc',
-            'google/type',
-        ]
-        # /googleapis is the root of the versioned googleapis repo
-        # inside Artman Docker image.
-        for src_dir in common_proto_dirs:
-            if not os.path.exists(os.path.join(root_dir, src_dir)):
-                copy_tree(os.path.join('/googleapis', src_dir),
-                          os.path.join(root_dir, src_dir))
+        return None
+    common_proto_dirs = [
+        'google/api',
+        'google/iam/v1',
+        'google/longrunning',
+        'google/rpc',
+        'google/type',
+    ]
+    missing_dirs = [src_dir for src_dir in common_proto_dirs
+                    if not os.path.exists(os.path.join(root_dir, src_dir))]
+    if not missing_dirs:
+        return None
+    common_root = os.path.join(
+        tempfile.gettempdir(),
+        'artman-common-protos-%s' % cache_utils.digest(missing_dirs)[:12])
+    if os.path.isdir(common_root):
+        return common_root
+
+    # The files are linked one by one, as the proto discovery does not follow
+    # symlinked directories. The tree is built aside and renamed into place,
+    # so that concurrent runs never see a partial one.
+    staging_dir = tempfile.mkdtemp(
+        prefix='.artman-common-protos-', dir=tempfile.gettempdir())
+    for src_dir in missing_dirs:
+        for dirpath, _, filenames in os.walk(
+                os.path.join(VERSIONED_GOOGLEAPIS_DIR, src_dir)):
+            target = os.path.join(
+                staging_dir, os.path.relpath(dirpath, VERSIONED_GOOGLEAPIS_DIR))
+            file_utils.makedirs(target)
+            for filename in filenames:
+                os.symlink(os.path.join(dirpath, filename),
+                           os.path.join(target, filename))
+    try:
+        os.rename(staging_dir, common_root)
+    except OSError:
+        # Another run provided the same directories first.
+        shutil.rmtree(staging_dir)
+    return common_root
 
 
 def parse_args(*args):
@@ -167,6 +450,87 @@ def parse_args(*args):
         default=ARTMAN_DOCKER_IMAGE,
         help=('[Optional] Specify docker image used by artman when running in '
               'a Docker instance. Default to `%s`' % ARTMAN_DOCKER_IMAGE))
+    parser.add_argument(
+        '--warm-container',
+        dest='warm_container',
+        action='store_true',
+        help='[Optional] If specified, run artman in a long-lived Docker '
+        'container, which is started on first use and reused by later '
+        'commands with the same image and directories. Run `artman docker '
+        'stop` to remove it.', )
+    parser.add_argument(
+        '--engine',
+        choices=['serial', 'parallel'],
+        default='serial',
+        help='[Optional] Taskflow engine used to run the pipeline. The '
+        '`parallel` engine runs tasks that do not depend on each other '
+        'concurrently. Default to `serial`', )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=None,
+        help='[Optional] Maximum number of tasks run concurrently by the '
+        '`parallel` engine. Default to the number of CPUs', )
+    parser.add_argument(
+        '--protoc-jobs',
+        type=int,
+        default=None,
+        help='[Optional] Maximum number of protoc invocations run '
+        'concurrently when a language needs several of them, such as one '
+        'per Go package. Default to the number of CPUs', )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=cache_utils.DEFAULT_CACHE_DIR,
+        help='[Optional] Directory where artman caches outputs that can be '
+        'reused across runs, such as descriptor sets. Pass an empty string '
+        'to disable caching. Default to `' + cache_utils.DEFAULT_CACHE_DIR +
+        '`', )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='[Optional] If specified, skip the code generation and format '
+        'tasks whose inputs and outputs are unchanged since the last '
+        'successful run into the same output directory, and reuse their '
+        'previous outputs. Runs are recorded under `<output-dir>/' +
+        cache_utils.INCREMENTAL_DIR + '`.', )
+    parser.add_argument(
+        '--task-log-dir',
+        type=str,
+        default=None,
+        help='[Optional] Directory to which the full output of the commands '
+        'run by each task is appended, in one `<task name>.log` file per '
+        'task.', )
+    parser.add_argument(
+        '--scratch-dir',
+        type=str,
+        default=None,
+        help='[Optional] Directory under which the intermediate files of each '
+        'run are written instead of the output directory, e.g. '
+        '`/dev/shm/artman` to keep them in memory. It covers the descriptor '
+        'sets and the generated GAPIC configs before they are moved, and the '
+        'transformed Python protos when `--cache-dir` is empty; the Java '
+        'gRPC and proto packages stay in the output directory. The files are '
+        'removed when the run succeeds.', )
+    parser.add_argument(
+        '--trace-out',
+        type=str,
+        default=None,
+        help='[Optional] File to which a timing trace of config loading, '
+        'pipeline construction, every task and every external command is '
+        'written, in the Chrome trace JSON format that Perfetto '
+        '(https://ui.perfetto.dev) opens. When running in Docker, the file '
+        'must be under the root or output directory.', )
+    parser.add_argument(
+        '--nailgun-jar',
+        type=str,
+        default=None,
+        help='[Optional] Path to a Nailgun server jar. If specified, '
+        'gapic-generator runs in a long-lived Nailgun server instead of a '
+        'new JVM per task. Requires the `ng` client on the PATH. The server '
+        'has no authentication, so only use this on a single-user machine. '
+        'It stops after %d minutes without use, or with `artman daemon '
+        'stop`.' % (generator_daemon.IDLE_TIMEOUT_SECS // 60), )
     parser.add_argument(
         '--generator-args',
         type=str,
@@ -176,7 +540,8 @@ def parse_args(*args):
 
     # Add sub-commands.
     subparsers = parser.add_subparsers(
-        dest='subcommand', help='Support [generate] sub-commands')
+        dest='subcommand',
+        help='Support [generate, generate-all, docker, daemon] sub-commands')
 
     # `generate` sub-command.
     parser_generate = subparsers.add_parser(
@@ -185,13 +550,54 @@ def parse_args(*args):
         'artifact_name',
         type=str,
         help='[Required] Name of the artifact for artman to generate. Must '
-        'match an artifact in the artman config yaml.')
+        'match an artifact in the artman config yaml. Several artifacts can '
+        'be given separated by commas, e.g. `java_gapic,python_gapic`, to '
+        'generate them in one run that shares their common work.')
     parser_generate.add_argument(
         '--aspect',
         type=str,
         default=None,
         help='[Optional] Aspect of output to generate: ALL, CODE, or PACKAGE')
 
+    # `generate-all` sub-command.
+    parser_generate_all = subparsers.add_parser(
+        'generate-all', help='Generate artifacts of many artman config yamls')
+    parser_generate_all.add_argument(
+        'configs',
+        type=str,
+        nargs='*',
+        help='[Optional] Paths to artman config yamls, either absolute or '
+        'relative to the input directory. Default to every `artman_*.yaml` '
+        'under the input directory.')
+    parser_generate_all.add_argument(
+        '--artifacts',
+        type=str,
+        default=None,
+        help='[Optional] Comma-separated names of the artifacts to generate, '
+        'e.g. `java_gapic,python_gapic`. Default to all artifacts.')
+    parser_generate_all.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='[Optional] Maximum number of APIs generated concurrently. '
+        'Default to the number of CPUs')
+
+    # `docker` sub-command.
+    parser_docker = subparsers.add_parser(
+        'docker', help='Manage the warm artman Docker containers')
+    parser_docker.add_argument(
+        'docker_action',
+        choices=['stop'],
+        help='`stop` removes the containers started by `--warm-container`.')
+
+    # `daemon` sub-command.
+    parser_daemon = subparsers.add_parser(
+        'daemon', help='Manage the gapic-generator daemons')
+    parser_daemon.add_argument(
+        'daemon_action',
+        choices=['stop'],
+        help='`stop` stops the servers started with `--nailgun-jar`.')
+
     return parser.parse_args(args=args)
 
 
@@ -208,6 +614,12 @@ def normalize_flags(flags, user_config):
             - pipeline name
             - pipeline arguments
     """
+    from ruamel import yaml
+    from artman.config import converter
+    from artman.config import loader
+    from artman.config.proto.config_pb2 import Artifact
+    from artman.utils import config_util
+
     if flags.root_dir:
         flags.root_dir = os.path.abspath(flags.root_dir)
         flags.config = os.path.join(flags.root_dir, flags.config)
@@ -230,6 +642,13 @@ def normalize_flags(flags, user_config):
     pipeline_args['root_dir'] = root_dir
     pipeline_args['toolkit_path'] = user_config.local.toolkit
     pipeline_args['generator_args'] = flags.generator_args
+    pipeline_args['engine'] = getattr(flags, 'engine', 'serial')
+    pipeline_args['cache_dir'] = getattr(flags, 'cache_dir', None)
+    pipeline_args['protoc_jobs'] = getattr(flags, 'protoc_jobs', None)
+    pipeline_args['incremental'] = getattr(flags, 'incremental', False)
+    task_log_dir = getattr(flags, 'task_log_dir', None)
+    pipeline_args['task_log_dir'] = (
+        os.path.abspath(task_log_dir) if task_log_dir else None)
 
     artman_config_path = flags.config
     if not os.path.isfile(artman_config_path):
@@ -237,12 +656,16 @@ def normalize_flags(flags, user_config):
             'Artman config file `%s` doesn\'t exist.' % artman_config_path)
         sys.exit(96)
 
-    try:
-        artifact_config = loader.load_artifact_config(
-            artman_config_path, flags.artifact_name, flags.aspect)
-    except ValueError as ve:
-        logger.error('Artifact config loading failed with `%s`' % ve)
-        sys.exit(96)
+    artifact_config = getattr(flags, 'artifact_config', None)
+    if artifact_config is None:
+        try:
+            with trace_utils.span('load config ' + flags.artifact_name,
+                                  'config'):
+                artifact_config = loader.load_artifact_config(
+                    artman_config_path, flags.artifact_name, flags.aspect)
+        except ValueError as ve:
+            logger.error('Artifact config loading failed with `%s`' % ve)
+            sys.exit(96)
 
     legacy_config_dict = converter.convert_to_legacy_config_dict(
         artifact_config, root_dir, flags.output_dir)
@@ -288,6 +711,10 @@ def normalize_flags(flags, user_config):
     config_args = config_util.load_config_spec(legacy_config_dict, language)
     config_args.update(pipeline_args)
     pipeline_args = config_args
+    common_proto_root = getattr(flags, 'common_proto_root', None)
+    if common_proto_root and 'import_proto_path' in pipeline_args:
+        pipeline_args['import_proto_path'] = (
+            pipeline_args['import_proto_path'] + [common_proto_root])
     # Print out the final arguments to stdout, to help the user with
     # possible debugging.
     pipeline_args_repr = yaml.dump(
@@ -329,8 +756,7 @@ def _run_artman_in_docker(flags):
           root_dir, inner_artman_cmd_str)
 
     # TODO(ethanbao): Such folder to folder mounting won't work on windows.
-    base_cmd = [
-        'docker', 'run', '--name', ARTMAN_CONTAINER_NAME, '--rm', '-i', '-t',
+    container_args = [
         '-e', 'HOST_USER_ID=%s' % os.getuid(),
         '-e', 'HOST_GROUP_ID=%s' % os.getgid(),
         '-e', '%s=True' % RUNNING_IN_ARTMAN_DOCKER_TOKEN,
@@ -339,6 +765,13 @@ def _run_artman_in_docker(flags):
         '-v', '%s:%s' % (artman_config_dirname, artman_config_dirname),
         '-w', root_dir
     ]
+    if getattr(flags, 'warm_container', False):
+        return _run_artman_in_warm_container(
+            docker_image, container_args, inner_artman_cmd_str, output_dir)
+
+    base_cmd = [
+        'docker', 'run', '--name', ARTMAN_CONTAINER_NAME, '--rm', '-i', '-t',
+    ] + container_args
     base_cmd.extend([docker_image, '/bin/bash', '-c'])
 
     inner_artman_debug_cmd_str = inner_artman_cmd_str
@@ -366,26 +799,102 @@ def _run_artman_in_docker(flags):
                      % ' '.join(debug_cmd))
 
 
-def _change_owner(flags, pipeline_name, pipeline_kwargs):
-    """Change file/directory ownership if necessary."""
-    user_host_id = int(os.getenv('HOST_USER_ID', 0))
-    group_host_id = int(os.getenv('HOST_GROUP_ID', 0))
+def _run_artman_in_warm_container(docker_image, container_args,
+                                  inner_artman_cmd_str, output_dir):
+    """Executes artman command in a long-lived container.
+
+    The container is started on first use and kept running; later commands
+    with the same image and mounted directories run in it with `docker exec`,
+    and their output is streamed back as it is produced. `artman docker stop`
+    removes the warm containers.
+    """
+    name = 'artman-warm-' + cache_utils.digest(
+        [docker_image] + container_args)[:12]
+    state = subprocess.run(
+        ['docker', 'inspect', '-f', '{{.State.Running}}', name],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if state.stdout.strip() != b'true':
+        if state.returncode == 0:
+            # The container exists but has stopped.
+            subprocess.call(['docker', 'rm', '-f', name],
+                            stdout=subprocess.DEVNULL)
+        logger.info('Starting warm artman container %s.' % name)
+        subprocess.check_output(
+            ['docker', 'run', '-d', '--name', name,
+             '--label', WARM_CONTAINER_LABEL] + container_args +
+            [docker_image, '/bin/bash', '-c', 'sleep infinity'])
+
+    exec_cmd = ['docker', 'exec', '-i']
+    if sys.stdout.isatty():
+        exec_cmd.append('-t')
+    exec_cmd.extend([name, '/bin/bash', '-c',
+                     'artman --local %s' % inner_artman_cmd_str])
+    if subprocess.call(exec_cmd):
+        logger.error(
+            'Artman execution failed. For additional logging, re-run the '
+            'command with the "--verbose" flag')
+        logger.debug('For further inspection inside docker container, run '
+                     '`docker exec -it %s bash`' % name)
+        sys.exit(32)
+    return output_dir
+
+
+def _stop_warm_containers():
+    """Removes the warm containers started by `--warm-container`."""
+    containers = subprocess.check_output(
+        ['docker', 'ps', '-a', '-q', '--filter',
+         'label=%s' % WARM_CONTAINER_LABEL]).decode('utf8').split()
+    if containers:
+        subprocess.check_output(['docker', 'rm', '-f'] + containers)
+    logger.info('Removed %d warm artman container(s).' % len(containers))
+
+
+def _snapshot_owned_directories(flags, pipeline_kwargs):
+    """Record the directories whose ownership is changed after a run.
+
+    Returns:
+        dict: The inode and modification time per directory under the
+            output directories, or None when artman does not run in Docker
+            on behalf of a host user. See `_change_owner`.
+    """
+    if not _host_ids():
+        return None
+    # A change within the timestamp granularity of the file system would go
+    # unnoticed, so directories modified just now are left out, and are
+    # treated as changed.
+    recent_ns = int((time.time() - 2) * 1e9)
+    snapshot = {}
+    for directory in _owned_directories(flags, pipeline_kwargs):
+        for root, _, _ in os.walk(directory):
+            version = _directory_version(root)
+            if version[1] < recent_ns:
+                snapshot[root] = version
+    return snapshot
+
+
+def _change_owner(flags, pipeline_name, pipeline_kwargs, snapshot=None):
+    """Change file/directory ownership if necessary.
+
+    An entry created by the run changes the modification time of its
+    directory, so only the entries of the directories which are new or
+    changed since `snapshot`, taken with `_snapshot_owned_directories`
+    before the run, are changed. Without a snapshot, every entry is. Entries
+    which are already owned by the host user are left alone.
+    """
     # When artman runs in Docker instance, all output files are by default
     # owned by `root`, making it non-editable by Docker host user. When host
     # user id and group id get passed through environment variables via
     # Docker `-e` flag, artman will change the owner based on the specified
     # user id and group id.
-    if not user_host_id or not group_host_id:
+    host_ids = _host_ids()
+    if not host_ids:
         return
-    # Change ownership of output directory.
-    if os.path.exists(flags.output_dir):
-        _change_directory_owner(flags.output_dir, user_host_id, group_host_id)
-
-    # Change the local repo directory if specified.
-    if 'local_repo_dir' in pipeline_kwargs:
-        local_repo_dir = pipeline_kwargs['local_repo_dir']
-        if (os.path.exists(local_repo_dir)):
-            _change_directory_owner(local_repo_dir, user_host_id, group_host_id)
+    user_host_id, group_host_id = host_ids
+    # Change ownership of output directory, and of the local repo directory
+    # if specified.
+    for directory in _owned_directories(flags, pipeline_kwargs):
+        _change_directory_owner(
+            directory, user_host_id, group_host_id, snapshot or {})
 
     if pipeline_kwargs['gapic_yaml']:
         gapic_config_path = pipeline_kwargs['gapic_yaml']
@@ -400,16 +909,47 @@ def _change_owner(flags, pipeline_name, pipeline_kwargs):
             os.chown(gapic_config_path, user_host_id, group_host_id)
 
 
-def _change_directory_owner(directory, user_host_id, group_host_id):
-    """Change ownership recursively for everything under the given directory."""
+def _host_ids():
+    """Return the (user id, group id) of the Docker host user, or None."""
+    user_host_id = int(os.getenv('HOST_USER_ID', 0))
+    group_host_id = int(os.getenv('HOST_GROUP_ID', 0))
+    if not user_host_id or not group_host_id:
+        return None
+    return user_host_id, group_host_id
+
+
+def _owned_directories(flags, pipeline_kwargs):
+    """Return the existing directories a run writes for the host user."""
+    directories = [flags.output_dir]
+    if 'local_repo_dir' in pipeline_kwargs:
+        directories.append(pipeline_kwargs['local_repo_dir'])
+    return [d for d in directories if os.path.exists(d)]
+
+
+def _change_directory_owner(directory, user_host_id, group_host_id, snapshot):
+    """Change ownership recursively for the entries under the given
+    directory, skipping the directories left unchanged since `snapshot`."""
     for root, dirs, files in os.walk(directory):
-        os.chown(root, user_host_id, group_host_id)
+        if snapshot.get(root) == _directory_version(root):
+            continue
+        _chown(root, user_host_id, group_host_id)
         for d in dirs:
-            os.chown(
-                os.path.join(root, d), user_host_id, group_host_id)
+            _chown(os.path.join(root, d), user_host_id, group_host_id)
         for f in files:
-            os.chown(
-                os.path.join(root, f), user_host_id, group_host_id)
+            _chown(os.path.join(root, f), user_host_id, group_host_id)
+
+
+def _directory_version(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _chown(path, user_host_id, group_host_id):
+    """Change the owner of a path, unless it is already right."""
+    stat = os.stat(path)
+    if stat.st_uid != user_host_id or stat.st_gid != group_host_id:
+        os.chown(path, user_host_id, group_host_id)
+
 
 if __name__ == "__main__":
     main()
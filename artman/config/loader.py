@@ -17,8 +17,8 @@ config.
 """
 
 from __future__ import absolute_import
+import collections
 import io
-import json
 import os
 
 from google.protobuf import json_format
@@ -36,6 +36,10 @@ CONFIG_NOT_FOUND_ERROR_MESSAGE_FORMAT = (
 INVALID_CONFIG_ERROR_MESSAGE_FORMAT = 'Artman YAML %s is invalid.'
 INVALID_USER_CONFIG_ERROR_MESSAGE_FORMAT = 'Artman user YAML %s is invalid.'
 
+# The libyaml based loader is much faster than the pure Python one, and is
+# used when PyYAML was built with it.
+_YAML_LOADER = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
 
 ARTIFACT_MAPPING = {
     'java_proto': {'language': 'JAVA', 'type': 'PROTOBUF'},
@@ -59,6 +63,29 @@ ARTIFACT_MAPPING = {
 
 def load_artifact_config(artman_config_path, artifact_name, aspect=None):
     artman_config = _read_artman_config(artman_config_path)
+    return _load_artifact_config(
+        artman_config, artman_config_path, artifact_name, aspect)
+
+
+def load_all_artifact_configs(artman_config_path, aspect=None):
+    """Return the configs of all the artifacts of an artman yaml.
+
+    The yaml is parsed once, and each artifact config is merged, validated
+    and normalized as `load_artifact_config` does.
+
+    Returns:
+        collections.OrderedDict: The artifact configs by artifact name, in
+            the order of `list_artifact_names`.
+    """
+    artman_config = _read_artman_config(artman_config_path)
+    return collections.OrderedDict(
+        (artifact_name, _load_artifact_config(
+            artman_config, artman_config_path, artifact_name, aspect))
+        for artifact_name in _artifact_names(artman_config))
+
+
+def _load_artifact_config(artman_config, artman_config_path, artifact_name,
+                          aspect):
     artifact_config = Artifact()
     artifact_config.CopyFrom(artman_config.common)
 
@@ -82,6 +109,21 @@ def load_artifact_config(artman_config_path, artifact_name, aspect=None):
         artifact_config, artman_config_path)
 
 
+def list_artifact_names(artman_config_path):
+    """Return the names of the artifacts configured in an artman yaml.
+
+    GAPIC config artifacts come last, since generating them overwrites the
+    GAPIC config that the other artifacts read.
+    """
+    return _artifact_names(_read_artman_config(artman_config_path))
+
+
+def _artifact_names(artman_config):
+    names = [artifact.name for artifact in artman_config.artifacts]
+    return sorted(names, key=lambda name: ARTIFACT_MAPPING.get(
+        name, {}).get('type') == 'GAPIC_CONFIG')
+
+
 def read_user_config(artman_user_config_path):
     """Parse and return artman config"""
     config_pb = UserConfig()
@@ -94,10 +136,7 @@ def read_user_config(artman_user_config_path):
 
     try:
         with io.open(artman_user_config_path, 'r', encoding='UTF-8') as f:
-            # Convert yaml into json file as protobuf python load support
-            # parsing of protobuf in json or text format, not yaml.
-            json_string = json.dumps(yaml.load(f, Loader=yaml.FullLoader))
-        json_format.Parse(json_string, config_pb)
+            json_format.ParseDict(_load_yaml(f), config_pb)
     except (json_format.ParseError, yaml.parser.ParserError):
         logger.error(INVALID_USER_CONFIG_ERROR_MESSAGE_FORMAT % artman_user_config_path)
         raise
@@ -120,12 +159,9 @@ def _parse(artman_yaml_path):
         raise ValueError(CONFIG_NOT_FOUND_ERROR_MESSAGE_FORMAT % artman_yaml_path)
 
     try:
-        with io.open(artman_yaml_path, 'r', encoding='UTF-8') as f:
-            # Convert yaml into json file as protobuf python load support paring of
-            # protobuf in json or text format, not yaml.
-            artman_config_json_string = json.dumps(yaml.load(f, Loader=yaml.FullLoader))
         config_pb = Config()
-        json_format.Parse(artman_config_json_string, config_pb)
+        with io.open(artman_yaml_path, 'r', encoding='UTF-8') as f:
+            json_format.ParseDict(_load_yaml(f), config_pb)
     except (json_format.ParseError, yaml.parser.ParserError):
         logger.error(INVALID_CONFIG_ERROR_MESSAGE_FORMAT % artman_yaml_path)
         raise
@@ -133,6 +169,12 @@ def _parse(artman_yaml_path):
     return config_pb
 
 
+def _load_yaml(f):
+    """Load a yaml file into the dict form of the json mapping of protobuf,
+    which protobuf can parse directly into a message."""
+    return yaml.load(f, Loader=_YAML_LOADER)
+
+
 def _validate_artman_config(config_pb):
     """ Validate the parsed config_pb.
 
@@ -22,6 +22,7 @@ import importlib
 from artman.utils import task_utils
 from artman.pipelines import pipeline_base
 from artman.tasks import io_tasks
+from artman.tasks import task_base
 from taskflow.patterns import linear_flow
 
 
@@ -44,11 +45,21 @@ class CodeGenerationPipelineBase(pipeline_base.PipelineBase):
             **kwargs)
 
     def do_build_flow(self, **kwargs):
-        tasks = task_utils.instantiate_tasks(
-            [io_tasks.PrepareGoogleapisDirTask], kwargs)
-        tasks += self.task_factory.get_tasks(**kwargs)
         flow = linear_flow.Flow('CodeGenerationPipeline')
-        flow.add(*tasks)
+        flow.add(*task_utils.instantiate_tasks(
+            [io_tasks.PrepareGoogleapisDirTask], kwargs))
+        tasks = self.task_factory.get_tasks(**kwargs)
+        if kwargs.get('engine') == 'parallel':
+            # The googleapis directory must be in place before anything
+            # else runs, so only the codegen tasks go into the graph.
+            flow.add(pipeline_base.make_graph_flow(
+                'CodeGenerationTasks', tasks))
+        else:
+            flow.add(*tasks)
+        if kwargs.get('incremental'):
+            # Runs are only recorded once every task has succeeded.
+            flow.add(*task_utils.instantiate_tasks(
+                [task_base.RecordIncrementalRunsTask], kwargs))
         return flow
 
     def validate_kwargs(self, **kwargs):
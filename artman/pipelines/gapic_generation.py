@@ -147,9 +147,13 @@ class GapicTaskFactory(code_gen.TaskFactoryBase):
         # the GRPC is "tucked into" the GAPIC, and that process is much easier
         # if the code is generated in this order.
         answer = []
+        format_tasks = []
 
         if 'gapic_code_dir' in kwargs:
             answer = self._get_gapic_codegen_tasks(**kwargs)
+            # The GAPIC is formatted last, once the GRPC has been tucked into
+            # it, so that the formatter never runs over a half-copied tree.
+            format_tasks = [tasks.format.get_format_task(kwargs['language'])]
 
         for grpc_task in self._get_grpc_codegen_tasks(**kwargs):
             if grpc_task not in answer:
@@ -159,6 +163,7 @@ class GapicTaskFactory(code_gen.TaskFactoryBase):
             if packaging_task not in answer:
                 answer.append(packaging_task)
 
+        answer += format_tasks
         answer += emit_success.TASKS
         return task_utils.instantiate_tasks(answer, kwargs)
 
@@ -176,7 +181,6 @@ class GapicTaskFactory(code_gen.TaskFactoryBase):
             tasks.descriptor.get_descriptor_set_task(language),
             tasks.package_metadata.PackageMetadataConfigGenTask,
             tasks.gapic.GapicCodeGenTask,
-            tasks.format.get_format_task(language),
         ]
 
     def _get_grpc_codegen_tasks(self, language, **kw):
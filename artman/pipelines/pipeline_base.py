@@ -15,6 +15,7 @@
 """Base class for pipeline."""
 
 from taskflow.flow import Flow
+from taskflow.patterns import graph_flow
 from taskflow.patterns import linear_flow
 
 
@@ -72,3 +73,45 @@ class EmptyPipeline(PipelineBase):
 
     def validate_kwargs(self, **kwargs):
         pass
+
+
+def make_graph_flow(name, tasks):
+    """Make a graph flow that lets independent tasks run concurrently.
+
+    The tasks are expected in the order a linear flow would run them. Each
+    task is linked after the latest earlier task providing a value it reads.
+    A task providing a value is also linked after the earlier provider of
+    that value and every task that read it since, because tasks hand over
+    directories on disk and a later provider must not overtake them. A task
+    listing a value in its `mutates` attribute changes that directory in
+    place, and is ordered as if it provided the value again. Tasks without
+    such a relationship are left unordered.
+
+    Args:
+        name (str): The name of the flow.
+        tasks (list): The task instances, in linear order.
+
+    Returns:
+        taskflow.patterns.graph_flow.Flow: The flow.
+    """
+    flow = graph_flow.Flow(name)
+    flow.add(*tasks, resolve_requires=False, resolve_existing=False)
+    providers = {}
+    consumers = {}
+    for task in tasks:
+        reads = set(task.rebind.values())
+        writes = set(task.provides) | set(getattr(task, 'mutates', ()))
+        deps = [providers[value] for value in reads if value in providers]
+        for value in writes:
+            if value in providers:
+                deps.append(providers[value])
+            deps.extend(consumers.get(value, []))
+        for value in reads:
+            consumers.setdefault(value, []).append(task)
+        for value in writes:
+            providers[value] = task
+            consumers[value] = []
+        for dep in set(deps):
+            if dep is not task:
+                flow.link(dep, task)
+    return flow
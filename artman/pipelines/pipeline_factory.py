@@ -12,23 +12,61 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Factory function that recreates pipeline based on pipeline name and
-kwargs."""
+kwargs.
 
+Pipelines are looked up by name in a registry of `module:Class` strings, and
+their modules are only imported when a pipeline is made. Other packages can
+add pipelines through the `artman.pipelines` entry point group, e.g.
+
+    entry_points={
+        'artman.pipelines': [
+            'MyPipeline = my_package.pipelines:MyPipeline',
+        ],
+    }
+"""
+
+import importlib
+
+try:
+    from importlib import metadata
+except ImportError:  # Python < 3.8
+    metadata = None
 
-from artman.pipelines import pipeline_base
-# These are required to list the subclasses of pipeline_base
-from artman.pipelines import sample_pipeline
-from artman.pipelines import gapic_generation
-from artman.pipelines import grpc_generation
-from artman.pipelines import core_generation
 from artman.utils.logger import logger
 
 __all__ = (
-    'core_generation', 'gapic_generation',
-    'grpc_generation', 'make_pipeline', 'make_pipeline_flow',
-    'pipeline_base', 'sample_pipeline',
+    'ENTRY_POINT_GROUP', 'PIPELINES', 'make_pipeline', 'make_pipeline_flow',
+    'pipeline_class', 'register',
 )
 
+ENTRY_POINT_GROUP = 'artman.pipelines'
+
+# The pipelines shipped with artman, by name.
+PIPELINES = {
+    'CoreProtoPipeline':
+        'artman.pipelines.core_generation:CoreProtoPipeline',
+    'DiscoGapicClientPipeline':
+        'artman.pipelines.gapic_generation:DiscoGapicClientPipeline',
+    'DiscoGapicConfigPipeline':
+        'artman.pipelines.gapic_generation:DiscoGapicConfigPipeline',
+    'EmptyPipeline': 'artman.pipelines.pipeline_base:EmptyPipeline',
+    'GapicClientPipeline':
+        'artman.pipelines.gapic_generation:GapicClientPipeline',
+    'GapicConfigPipeline':
+        'artman.pipelines.gapic_generation:GapicConfigPipeline',
+    'GapicOnlyClientPipeline':
+        'artman.pipelines.gapic_generation:GapicOnlyClientPipeline',
+    'GrpcClientPipeline':
+        'artman.pipelines.grpc_generation:GrpcClientPipeline',
+    'ProtoClientPipeline':
+        'artman.pipelines.grpc_generation:ProtoClientPipeline',
+    'SamplePipeline': 'artman.pipelines.sample_pipeline:SamplePipeline',
+}
+
+# Pipeline classes which have already been imported, by name.
+_classes = {}
+_entry_points_loaded = False
+
 
 def make_pipeline_flow(pipeline_name, **kwargs):
     """Factory function to make a GAPIC pipeline.
@@ -47,19 +85,63 @@ def make_pipeline_flow(pipeline_name, **kwargs):
 
 
 def make_pipeline(pipeline_name, **kwargs):
-    for cls in _rec_subclasses(pipeline_base.PipelineBase):
-        if cls.__name__ == pipeline_name:
-            logger.info("Creating %s." % pipeline_name)
-            return cls(**kwargs)
-    raise ValueError("Invalid pipeline name: %s" % pipeline_name)
-
-
-def _rec_subclasses(cls):
-    """Returns all recursive subclasses of a given class (i.e., subclasses,
-    sub-subclasses, etc.)"""
-    subclasses = []
-    if cls.__subclasses__():
-        for subcls in cls.__subclasses__():
-            subclasses.append(subcls)
-            subclasses += _rec_subclasses(subcls)
-    return subclasses
+    cls = pipeline_class(pipeline_name)
+    logger.info("Creating %s." % pipeline_name)
+    return cls(**kwargs)
+
+
+def register(pipeline_name, target):
+    """Register a pipeline.
+
+    Args:
+        pipeline_name (str): The name the pipeline is made by.
+        target (str): The pipeline class, as a `module:Class` string.
+    """
+    PIPELINES[pipeline_name] = target
+    _classes.pop(pipeline_name, None)
+
+
+def pipeline_class(pipeline_name):
+    """Return the class of a registered pipeline, importing its module.
+
+    Raises:
+        ValueError: If no pipeline of this name is registered.
+    """
+    cls = _classes.get(pipeline_name)
+    if cls is not None:
+        return cls
+    if pipeline_name not in PIPELINES:
+        _load_entry_points()
+    if pipeline_name not in PIPELINES:
+        raise ValueError("Invalid pipeline name: %s" % pipeline_name)
+    module_name, _, class_name = PIPELINES[pipeline_name].partition(':')
+    cls = importlib.import_module(module_name)
+    for attr in class_name.split('.'):
+        cls = getattr(cls, attr)
+    _classes[pipeline_name] = cls
+    return cls
+
+
+def _load_entry_points():
+    """Register the pipelines of the `artman.pipelines` entry points.
+
+    The installed distributions are only scanned once. The pipelines
+    registered in code take precedence.
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    if metadata is None:
+        import pkg_resources
+        for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+            PIPELINES.setdefault(entry_point.name, '%s:%s' % (
+                entry_point.module_name, '.'.join(entry_point.attrs)))
+        return
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        group = entry_points.select(group=ENTRY_POINT_GROUP)
+    else:  # Python < 3.10
+        group = entry_points.get(ENTRY_POINT_GROUP, ())
+    for entry_point in group:
+        PIPELINES.setdefault(entry_point.name, entry_point.value)
@@ -32,7 +32,7 @@ from artman.tasks import python_grpc_tasks as python_grpc
 from artman.tasks.task_base import Task, EmptyTask
 
 __all__ = (
-    'EmptyTask', 'format', 'gapic', 'io',
-    'package_metadata', 'protoc', 'python_grpc', 'success'
+    'EmptyTask', 'descriptor', 'format', 'gapic', 'io',
+    'package_metadata', 'protoc', 'python_grpc', 'success',
     'Task',
 )
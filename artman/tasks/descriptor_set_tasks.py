@@ -14,8 +14,10 @@
 
 """Tasks that work directly with a descriptor set"""
 
+import collections
 import os
 import re
+import uuid
 
 import pypandoc
 from artman.tasks import task_base
@@ -42,16 +44,27 @@ class PythonDocsConvertionTask(task_base.TaskBase):
         with open(descriptor_set, 'rb') as f:
             desc_set.ParseFromString(f.read())
 
+        locations = []
+        comments = []
         for file_descriptor_proto in desc_set.file:
             if not file_descriptor_proto.source_code_info:
                 continue
 
             for location in file_descriptor_proto.source_code_info.location:
-                location.leading_comments = md2rst(location.leading_comments)
-                location.trailing_comments = md2rst(location.trailing_comments)
-                detached = [md2rst(c) for c in location.leading_detached_comments]
-                del location.leading_detached_comments[:]
-                location.leading_detached_comments.extend(detached)
+                locations.append(location)
+                comments.append(location.leading_comments)
+                comments.append(location.trailing_comments)
+                comments.extend(location.leading_detached_comments)
+
+        # Convert all comments up front, so that pandoc runs a few times
+        # rather than once per comment.
+        converted = md2rst_all(comments)
+        for location in locations:
+            location.leading_comments = converted[location.leading_comments]
+            location.trailing_comments = converted[location.trailing_comments]
+            detached = [converted[c] for c in location.leading_detached_comments]
+            del location.leading_detached_comments[:]
+            location.leading_detached_comments.extend(detached)
 
         desc_file, desc_ext = os.path.splitext(descriptor_set)
         new_descriptor_set = desc_file + '_updated_py_docs' + desc_ext
@@ -115,14 +128,46 @@ def md2rst(comment):
     - Resolves relative URLs to https://cloud.google.com
     - Runs pandoc to convert from markdown to restructuredtext
     """
-    comment = _replace_proto_link(comment)
-    comment = _replace_relative_link(comment)
-    # Calling pypandoc.convert_text is slow, so we try to avoid it if there are
-    # no special characters in the markdown.
-    if any([i in comment for i in '`[]*_']):
-        comment = pypandoc.convert_text(comment, 'rst', format='commonmark')
-        # Comments are now valid restructuredtext, but there is a problem. They
-        # are being inserted back into a descriptor set, and there is an
+    return md2rst_all([comment])[comment]
+
+
+def md2rst_all(comments):
+    """Convert many comments from protobuf markdown to restructuredtext.
+
+    This does the same as `md2rst` for each comment, but converts identical
+    comments once and runs pandoc on batches of comments.
+
+    Args:
+        comments (iterable): The comments to convert.
+
+    Returns:
+        dict: Each distinct comment mapped to its conversion.
+    """
+    result = {}
+    # Comments that still need pandoc after the link replacements, mapped
+    # to the original comments they come from.
+    pending = collections.OrderedDict()
+    for comment in collections.OrderedDict.fromkeys(comments):
+        text = _replace_relative_link(_replace_proto_link(comment))
+        # Calling pandoc is slow, so we try to avoid it if there are no
+        # special characters in the markdown.
+        if any([i in text for i in '`[]*_']):
+            pending.setdefault(text, []).append(comment)
+        else:
+            result[comment] = text
+
+    converted = {}
+    batchable = []
+    for text in pending:
+        if _document_scoped_re.search(text):
+            converted[text] = _convert(text)
+        else:
+            batchable.append(text)
+    converted.update(_convert_batches(batchable))
+
+    for text, originals in pending.items():
+        # Comments are now valid restructuredtext, but there is a problem.
+        # They are being inserted back into a descriptor set, and there is an
         # expectation that each line of a comment will begin with a space, to
         # separate it from the '//' that begins the comment. You would think
         # that we could ignore this detail, but it will cause formatting
@@ -131,8 +176,68 @@ def md2rst(comment):
         # that actually do begin with a space, so we insert the additional
         # space now. Comments that are not processed by pypandoc will already
         # have a leading space, so should not be changed.
-        comment = _insert_spaces(comment)
-    return comment
+        rst = _insert_spaces(converted[text])
+        for comment in originals:
+            result[comment] = rst
+    return result
+
+
+# Markdown whose conversion depends on the rest of the document (reference
+# definitions, images turned into substitutions, headings whose levels get
+# normalized), which is therefore not converted together with other comments.
+_document_scoped_re = re.compile(
+    r'!\[|^ {0,3}(\[[^\]]+\]:|#{1,6}(\s|$)|(=+|-+)\s*$)', re.MULTILINE)
+
+# The maximum number of characters converted by one pandoc process.
+_BATCH_SIZE = 1 << 20
+
+
+def _convert(text):
+    return pypandoc.convert_text(text, 'rst', format='commonmark')
+
+
+def _convert_batches(texts):
+    """Convert texts with one pandoc process per batch of texts.
+
+    Returns:
+        dict: The texts mapped to their conversion.
+    """
+    converted = {}
+    batch = []
+    size = 0
+    for text in texts:
+        if batch and size + len(text) > _BATCH_SIZE:
+            converted.update(_convert_batch(batch))
+            batch = []
+            size = 0
+        batch.append(text)
+        size += len(text)
+    if batch:
+        converted.update(_convert_batch(batch))
+    return converted
+
+
+def _convert_batch(batch):
+    """Convert texts with a single pandoc process.
+
+    The texts are joined into one document, separated by a paragraph that
+    cannot occur in them, and the output is split at that paragraph again.
+    If the output does not split back into as many parts (e.g. because a
+    text left a code block open), each half of the batch is converted
+    separately.
+    """
+    if len(batch) == 1:
+        return {batch[0]: _convert(batch[0])}
+    separator = 'artmanseparator' + uuid.uuid4().hex
+    output = _convert(('\n\n' + separator + '\n\n').join(batch))
+    parts = re.split(r'\n*^' + separator + r'\n+', output, flags=re.MULTILINE)
+    if len(parts) != len(batch):
+        middle = len(batch) // 2
+        converted = _convert_batch(batch[:middle])
+        converted.update(_convert_batch(batch[middle:]))
+        return converted
+    # Pandoc ends every document with a single newline.
+    return {text: part.rstrip('\n') + '\n' for text, part in zip(batch, parts)}
 
 
 _DESC_TASK_DICT = {
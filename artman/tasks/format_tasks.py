@@ -25,6 +25,9 @@ from artman.utils.logger import logger
 # TODO: Store both intermediate and final output in all format tasks.
 
 class JavaFormatTask(task_base.TaskBase):
+    mutates = ('gapic_code_dir',)
+
+    @task_base.incremental('gapic_code_dir', 'toolkit_path')
     def execute(self, gapic_code_dir, toolkit_path):
         logger.debug('Formatting files in %s.' %
                     os.path.abspath(gapic_code_dir))
@@ -43,6 +46,9 @@ class JavaFormatTask(task_base.TaskBase):
 
 
 class GoFormatTask(task_base.TaskBase):
+    mutates = ('gapic_code_dir',)
+
+    @task_base.incremental('gapic_code_dir')
     def execute(self, gapic_code_dir):
         logger.debug('Formatting files in %s.' %
                     os.path.abspath(gapic_code_dir))
@@ -50,6 +56,9 @@ class GoFormatTask(task_base.TaskBase):
 
 
 class PhpFormatTask(task_base.TaskBase):
+    mutates = ('gapic_code_dir',)
+
+    @task_base.incremental('gapic_code_dir')
     def execute(self, gapic_code_dir):
         abs_code_dir = os.path.abspath(gapic_code_dir)
         logger.debug('Formatting file using php-cs-fixer in %s.' % abs_code_dir)
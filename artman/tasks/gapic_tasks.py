@@ -18,6 +18,7 @@ import glob
 from ruamel import yaml
 
 from artman.tasks import task_base
+from artman.utils import file_utils
 from artman.utils import task_utils
 
 
@@ -26,11 +27,12 @@ class GapicConfigGenTask(task_base.TaskBase):
     default_provides = 'gapic_config_path'
 
     def execute(self, toolkit_path, descriptor_set, service_yaml,
-                output_dir, api_name, api_version, organization_name):
+                output_dir, api_name, api_version, organization_name,
+                scratch_dir=None):
         api_full_name = task_utils.api_full_name(
             api_name, api_version, organization_name)
         config_gen_dir = os.path.join(
-            output_dir, api_full_name + '-config-gen')
+            scratch_dir or output_dir, api_full_name + '-config-gen')
         self.exec_command(['mkdir', '-p', config_gen_dir])
         config_gen_path = os.path.join(config_gen_dir,
                                        api_full_name + '_gapic.yaml')
@@ -51,11 +53,12 @@ class DiscoGapicConfigGenTask(task_base.TaskBase):
     default_provides = 'gapic_config_path'
 
     def execute(self, toolkit_path, discovery_doc,
-        output_dir, api_name, api_version, organization_name):
+        output_dir, api_name, api_version, organization_name,
+        scratch_dir=None):
         api_full_name = task_utils.api_full_name(
             api_name, api_version, organization_name)
         config_gen_dir = os.path.join(
-            output_dir, api_full_name + '-config-gen')
+            scratch_dir or output_dir, api_full_name + '-config-gen')
         self.exec_command(['mkdir', '-p', config_gen_dir])
         config_gen_path = os.path.join(config_gen_dir,
                                        api_full_name + '_gapic.yaml')
@@ -100,6 +103,9 @@ class GapicCodeGenTask(task_base.TaskBase):
     """Generates GAPIC wrappers"""
     default_provides = 'gapic_code_dir'
 
+    @task_base.incremental('toolkit_path', 'descriptor_set', 'service_yaml',
+                           'gapic_yaml', 'package_metadata_yaml', 'samples',
+                           'grpc_service_config')
     def execute(self, language, toolkit_path, descriptor_set, service_yaml,
                 gapic_yaml, package_metadata_yaml, proto_package,
                 gapic_code_dir, api_name, api_version, organization_name,
@@ -188,6 +194,8 @@ class DiscoGapicCodeGenTask(task_base.TaskBase):
 
 
 class CSharpGapicPackagingTask(task_base.TaskBase):
+    mutates = ('gapic_code_dir',)
+
     def execute(self, gapic_code_dir, grpc_code_dir, proto_code_dir, gapic_yaml):
         with open(gapic_yaml) as f:
             gapic_config = yaml.load(f, Loader=yaml.Loader)
@@ -195,5 +203,7 @@ class CSharpGapicPackagingTask(task_base.TaskBase):
         package_root = '{0}/{1}'.format(gapic_code_dir, package_name)
         prod_dir = '{0}/{1}'.format(package_root, package_name)
         # Copy proto/grpc .cs files into prod directory
-        self.exec_command(['sh', '-c', 'cp {0}/*.cs {1}'.format(proto_code_dir, prod_dir)])
-        self.exec_command(['sh', '-c', 'cp {0}/*.cs {1}'.format(grpc_code_dir, prod_dir)])
+        file_utils.copy_files(
+            (src, os.path.join(prod_dir, os.path.basename(src)))
+            for code_dir in (proto_code_dir, grpc_code_dir)
+            for src in sorted(glob.glob('{0}/*.cs'.format(code_dir))))
@@ -22,8 +22,6 @@ import zipfile
 
 from six.moves import urllib
 
-from gcloud import storage
-
 from artman.tasks import task_base
 from artman.utils.logger import logger
 
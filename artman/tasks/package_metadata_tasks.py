@@ -70,6 +70,10 @@ class PackageMetadataConfigGenTask(task_base.TaskBase):
 
     # Separated so that this can be mocked for testing
     def _write_yaml(self, config_dict, dest):
+        if not os.path.exists(os.path.dirname(dest)):
+            # With the parallel engine this task may run before any other
+            # task has created the output directory.
+            os.makedirs(os.path.dirname(dest))
         with io.open(dest, 'w', encoding='UTF-8') as f:
             yaml.safe_dump(config_dict, f, default_flow_style=False)
 
@@ -14,17 +14,22 @@
 
 """Tasks related to protoc"""
 
+from concurrent import futures
 import io
 import json
+import multiprocessing
 import os
 import re
+import shutil
 from ruamel import yaml
 
 import six
 
 from artman.tasks import task_base
+from artman.utils import file_utils
 from artman.utils import task_utils
 from artman.utils.logger import logger
+from artman.utils import protoc_runner
 from artman.utils import protoc_utils
 
 
@@ -32,13 +37,17 @@ class ProtoDescGenTask(task_base.TaskBase):
     """Generates proto descriptor set"""
     default_provides = 'descriptor_set'
 
+    @task_base.incremental('src_proto_path', 'import_proto_path',
+                           'toolkit_path')
     def execute(self, src_proto_path, import_proto_path, output_dir,
                 api_name, api_version, organization_name, toolkit_path,
-                root_dir, excluded_proto_path=[], proto_deps=[], language='python'):
+                root_dir, excluded_proto_path=[], proto_deps=[], language='python',
+                cache_dir=None, scratch_dir=None):
         desc_proto_paths = []
         for dep in proto_deps:
             if 'proto_path' in dep and dep['proto_path']:
-                desc_proto_paths.append(os.path.join(root_dir, dep['proto_path']))
+                desc_proto_paths.append(self._find_dep_path(
+                    dep['proto_path'], root_dir, import_proto_path))
         desc_protos = list(
             protoc_utils.find_protos(src_proto_path + desc_proto_paths,
                                      excluded_proto_path))
@@ -47,7 +56,10 @@ class ProtoDescGenTask(task_base.TaskBase):
         desc_out_file = task_utils.api_full_name(
             api_name, api_version, organization_name) + '.desc'
         logger.debug('Compiling descriptors for {0}'.format(desc_protos))
-        self.exec_command(['mkdir', '-p', output_dir])
+        # The descriptor set is an intermediate, kept out of the output
+        # directory when a scratch directory is given.
+        desc_dir = scratch_dir or output_dir
+        self.exec_command(['mkdir', '-p', desc_dir])
 
         proto_params = protoc_utils.PROTO_PARAMS_MAP[language]
 
@@ -61,12 +73,37 @@ class ProtoDescGenTask(task_base.TaskBase):
         params = proto_params.proto_compiler_command + \
             common_resources_includes + \
             protoc_utils.protoc_header_params(header_proto_path, toolkit_path) + \
-            protoc_utils.protoc_desc_params(output_dir, desc_out_file) + \
+            protoc_utils.protoc_desc_params(desc_dir, desc_out_file) + \
             common_resources_paths + \
             desc_protos
 
-        self.exec_command(params)
-        return os.path.join(output_dir, desc_out_file)
+        desc_out_path = os.path.join(desc_dir, desc_out_file)
+        if cache_dir:
+            # Protoc output only depends on its inputs, so reuse the
+            # descriptor set of an identical earlier run.
+            cache_key = protoc_utils.descriptor_set_cache_key(
+                params, common_resources_paths + desc_protos)
+            if protoc_utils.fetch_cached_descriptor_set(
+                    cache_dir, cache_key, params, desc_out_path):
+                logger.debug('Reusing cached descriptor set {0}'.format(
+                    cache_key))
+                return desc_out_path
+
+        protoc_runner.run(self, params)
+        if cache_dir:
+            protoc_utils.store_cached_descriptor_set(
+                cache_dir, cache_key, params, desc_out_path)
+        return desc_out_path
+
+    def _find_dep_path(self, proto_path, root_dir, import_proto_path):
+        """Resolve the proto path of a dependency, falling back to the import
+        proto path when it is not in the root dir, e.g. for common protos
+        provided by artman."""
+        for base_dir in [root_dir] + import_proto_path:
+            dep_path = os.path.join(base_dir, proto_path)
+            if os.path.exists(dep_path):
+                return dep_path
+        return os.path.join(root_dir, proto_path)
 
 
 class ProtocCodeGenTaskBase(task_base.TaskBase):
@@ -77,7 +114,8 @@ class ProtocCodeGenTaskBase(task_base.TaskBase):
             toolkit_path, gapic_yaml, root_dir,
             gen_proto=False, gen_grpc=False, gen_common_resources=False,
             final_src_proto_path=None, final_import_proto_path=None,
-            excluded_proto_path=[], language_out_override=None):
+            excluded_proto_path=[], language_out_override=None,
+            protoc_jobs=None):
         # Adding 17th parameter is a sin that I commit here just because
         # refactoring of this code will never happen.
         src_proto_path = final_src_proto_path or src_proto_path
@@ -127,7 +165,8 @@ class ProtocCodeGenTaskBase(task_base.TaskBase):
         else:
             protos_map = { "": all_protos }
 
-        for (dirname, protos) in protos_map.items():
+        commands = []
+        for (dirname, protos) in sorted(protos_map.items()):
             # It is possible to get duplicate protos. De-dupe them.
             protos = sorted(set(protos))
 
@@ -140,22 +179,54 @@ class ProtocCodeGenTaskBase(task_base.TaskBase):
                 protoc_plugin_params + \
                 common_resources_paths + \
                 protos
+            commands.append((dirname, command_params))
 
-            # Execute protoc.
-            self.exec_command(command_params)
+        # Execute protoc. The per-package invocations write disjoint files,
+        # so they can run concurrently.
+        if len(commands) == 1 or protoc_jobs == 1:
+            for _, command_params in commands:
+                protoc_runner.run(self, command_params)
+        else:
+            self._exec_commands_concurrently(commands, protoc_jobs)
 
         return pkg_dir
 
+    def _exec_commands_concurrently(self, commands, max_workers):
+        """Run protoc commands on a thread pool.
+
+        Every command runs even if another one fails; the failures are then
+        reported together, in the order of the commands.
+
+        Args:
+            commands (list): (package name, command line) pairs.
+            max_workers (int): The maximum number of concurrent commands, or
+                None for the number of CPUs.
+        """
+        max_workers = max_workers or multiprocessing.cpu_count()
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = [(dirname,
+                        executor.submit(protoc_runner.run, self, params))
+                       for dirname, params in commands]
+        failed = [dirname for dirname, result in results
+                  if result.exception() is not None]
+        if failed:
+            raise RuntimeError(
+                'protoc failed for {0} of {1} packages: {2}'.format(
+                    len(failed), len(commands), ', '.join(failed)))
+
 
 class ProtoCodeGenTask(ProtocCodeGenTaskBase):
     default_provides = 'proto_code_dir'
 
     """Generates protos"""
+    @task_base.incremental('src_proto_path', 'import_proto_path',
+                           'toolkit_path', 'gapic_yaml', 'final_src_proto_path',
+                           'final_import_proto_path')
     def execute(self, language, src_proto_path, import_proto_path,
                 output_dir, api_name, api_version, organization_name,
                 toolkit_path, gapic_yaml, root_dir, final_src_proto_path=None,
                 final_import_proto_path=None, excluded_proto_path=[],
-                language_out_override=None):
+                language_out_override=None, protoc_jobs=None):
         pkg_dir = protoc_utils.prepare_proto_pkg_dir(
             output_dir, api_name, api_version, organization_name, language)
         return self._execute_proto_codegen(
@@ -165,7 +236,8 @@ class ProtoCodeGenTask(ProtocCodeGenTaskBase):
             final_src_proto_path=final_src_proto_path,
             final_import_proto_path=final_import_proto_path,
             excluded_proto_path=excluded_proto_path,
-            language_out_override=language_out_override)
+            language_out_override=language_out_override,
+            protoc_jobs=protoc_jobs)
 
 class ResourceNameGenTask(ProtocCodeGenTaskBase):
     default_provides = 'proto_code_dir'
@@ -175,7 +247,7 @@ class ResourceNameGenTask(ProtocCodeGenTaskBase):
                 output_dir, api_name, api_version, organization_name,
                 toolkit_path, gapic_yaml, root_dir, final_src_proto_path=None,
                 final_import_proto_path=None, excluded_proto_path=[],
-                language_out_override=None):
+                language_out_override=None, protoc_jobs=None):
         pkg_dir = protoc_utils.prepare_proto_pkg_dir(
             output_dir, api_name, api_version, organization_name, language)
         return self._execute_proto_codegen(
@@ -185,17 +257,21 @@ class ResourceNameGenTask(ProtocCodeGenTaskBase):
             final_src_proto_path=final_src_proto_path,
             final_import_proto_path=final_import_proto_path,
             excluded_proto_path=excluded_proto_path,
-            language_out_override=language_out_override)
+            language_out_override=language_out_override,
+            protoc_jobs=protoc_jobs)
 
 class GrpcCodeGenTask(ProtocCodeGenTaskBase):
     default_provides = 'grpc_code_dir'
 
     """Generates the gRPC client library"""
+    @task_base.incremental('src_proto_path', 'import_proto_path',
+                           'toolkit_path', 'gapic_yaml', 'final_src_proto_path',
+                           'final_import_proto_path')
     def execute(self, language, src_proto_path, import_proto_path,
                 toolkit_path, output_dir, api_name, api_version,
                 organization_name, gapic_yaml, root_dir, final_src_proto_path=None,
                 final_import_proto_path=None, excluded_proto_path=[],
-                language_out_override=None):
+                language_out_override=None, protoc_jobs=None):
         pkg_dir = protoc_utils.prepare_grpc_pkg_dir(
             output_dir, api_name, api_version, organization_name, language)
         return self._execute_proto_codegen(
@@ -205,7 +281,8 @@ class GrpcCodeGenTask(ProtocCodeGenTaskBase):
             final_src_proto_path=final_src_proto_path,
             final_import_proto_path=final_import_proto_path,
             excluded_proto_path=excluded_proto_path,
-            language_out_override=language_out_override)
+            language_out_override=language_out_override,
+            protoc_jobs=protoc_jobs)
 
 
 class ProtoAndGrpcCodeGenTask(ProtocCodeGenTaskBase):
@@ -216,7 +293,7 @@ class ProtoAndGrpcCodeGenTask(ProtocCodeGenTaskBase):
                 toolkit_path, output_dir, api_name, api_version,
                 organization_name, gapic_yaml, root_dir, final_src_proto_path=None,
                 final_import_proto_path=None, excluded_proto_path=[],
-                language_out_override=None):
+                language_out_override=None, protoc_jobs=None):
         pkg_dir = protoc_utils.prepare_grpc_pkg_dir(
             output_dir, api_name, api_version, organization_name, language)
         return self._execute_proto_codegen(
@@ -226,38 +303,43 @@ class ProtoAndGrpcCodeGenTask(ProtocCodeGenTaskBase):
             final_src_proto_path=final_src_proto_path,
             final_import_proto_path=final_import_proto_path,
             excluded_proto_path=excluded_proto_path,
-            language_out_override=language_out_override)
+            language_out_override=language_out_override,
+            protoc_jobs=protoc_jobs)
 
 
 class GoCopyTask(task_base.TaskBase):
+    mutates = ('gapic_code_dir',)
+
     def execute(self, gapic_code_dir, grpc_code_dir):
         for entry in os.listdir(grpc_code_dir):
             src_path = os.path.join(grpc_code_dir, entry)
-            self.exec_command([
-                'cp', '-rf', src_path, gapic_code_dir])
+            file_utils.copy_tree(src_path, gapic_code_dir)
 
 
 class RubyGrpcCopyTask(task_base.TaskBase):
     """Copies the generated protos and gRPC client library to
     the gapic_code_dir/lib.
     """
+    mutates = ('gapic_code_dir',)
+
     def execute(self, api_name, api_version, language, organization_name,
                 output_dir, gapic_code_dir, grpc_code_dir):
         final_output_dir = os.path.join(gapic_code_dir, 'lib')
         logger.info('Copying %s/* to %s.' % (grpc_code_dir, final_output_dir))
-        if not os.path.exists(final_output_dir):
-            self.exec_command(['mkdir', '-p', final_output_dir])
+        file_utils.makedirs(final_output_dir)
         for entry in sorted(os.listdir(grpc_code_dir)):
             src_path = os.path.join(grpc_code_dir, entry)
-            self.exec_command([
-                'cp', '-rf', src_path, final_output_dir])
+            file_utils.copy_tree(src_path, final_output_dir)
 
 
 class JavaProtoCopyTask(task_base.TaskBase):
     """Copies the .proto files into the grpc_code_dir directory
     """
+    mutates = ('proto_code_dir',)
+
     def execute(self, src_proto_path, proto_code_dir, excluded_proto_path=[]):
         grpc_proto_dir = os.path.join(proto_code_dir, 'src', 'main', 'proto')
+        copies = []
         for proto_path in src_proto_path:
             index = protoc_utils.find_google_dir_index(proto_path)
             for src_proto_file in protoc_utils.find_protos(
@@ -265,9 +347,8 @@ class JavaProtoCopyTask(task_base.TaskBase):
                 relative_proto_file = src_proto_file[index:]
                 dst_proto_file = os.path.join(
                     grpc_proto_dir, relative_proto_file)
-                self.exec_command(
-                    ['mkdir', '-p', os.path.dirname(dst_proto_file)])
-                self.exec_command(['cp', src_proto_file, dst_proto_file])
+                copies.append((src_proto_file, dst_proto_file))
+        file_utils.copy_files(copies)
 
 
 class PhpGrpcMoveTask(task_base.TaskBase):
@@ -275,20 +356,18 @@ class PhpGrpcMoveTask(task_base.TaskBase):
     the gapic_code_dir/proto directory.
     """
     default_provides = 'grpc_code_dir'
+    mutates = ('gapic_code_dir',)
 
     def execute(self, grpc_code_dir, gapic_code_dir=None):
         if not gapic_code_dir:
             return grpc_code_dir
         final_output_dir = os.path.join(gapic_code_dir, 'proto')
-        if not os.path.exists(final_output_dir):
-            self.exec_command(['mkdir', '-p', final_output_dir])
+        file_utils.makedirs(final_output_dir)
         logger.info('Moving %s/* to %s.' % (grpc_code_dir, final_output_dir))
         for entry in sorted(os.listdir(grpc_code_dir)):
             src_path = os.path.join(grpc_code_dir, entry)
-            self.exec_command([
-                'mv', src_path, os.path.join(final_output_dir, entry)])
-        self.exec_command([
-            'rm', '-r', grpc_code_dir])
+            file_utils.move(src_path, os.path.join(final_output_dir, entry))
+        shutil.rmtree(grpc_code_dir)
         return final_output_dir
 
 
@@ -296,6 +375,7 @@ class PhpGrpcMoveTask(task_base.TaskBase):
 # gRPC, we should remove this.
 class PhpGrpcRenameTask(task_base.TaskBase):
     """Rename references to proto files in the gRPC stub."""
+    mutates = ('grpc_code_dir',)
 
     def execute(self, grpc_code_dir):
         for filename in protoc_utils.list_files_recursive(grpc_code_dir):
@@ -312,10 +392,13 @@ class NodeJsProtoCopyTask(task_base.TaskBase):
     """Copies the .proto files into the gapic_code_dir/proto directory
     and compiles these proto files to protobufjs JSON.
     """
+    mutates = ('gapic_code_dir',)
+
     def execute(self, gapic_code_dir, src_proto_path, excluded_proto_path=[]):
         final_output_dir = os.path.join(gapic_code_dir, 'protos')
         src_dir = os.path.join(gapic_code_dir, 'src')
         proto_files = []
+        copies = []
         for proto_path in src_proto_path:
             index = protoc_utils.find_google_dir_index(proto_path)
             for src_proto_file in protoc_utils.find_protos(
@@ -324,12 +407,7 @@ class NodeJsProtoCopyTask(task_base.TaskBase):
                 proto_files.append(relative_proto_file)
                 dst_proto_file = os.path.join(
                     final_output_dir, relative_proto_file)
-                dst_proto_dir = os.path.dirname(dst_proto_file)
-                if not os.path.exists(dst_proto_dir):
-                    self.exec_command(['mkdir', '-p', dst_proto_dir])
-                self.exec_command(['cp', src_proto_file, dst_proto_file])
+                copies.append((src_proto_file, dst_proto_file))
+        file_utils.copy_files(copies)
         # Execute compileProtos from Docker image (a part of from google-gax)
-        cwd = os.getcwd()
-        os.chdir(gapic_code_dir)
-        self.exec_command(['compileProtos', './src'])
-        os.chdir(cwd)
+        self.exec_command(['compileProtos', './src'], cwd=gapic_code_dir)
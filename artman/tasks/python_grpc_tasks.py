@@ -17,12 +17,16 @@
 import io
 import os
 import re
+import shutil
 import tempfile
-import time
 
 from ruamel import yaml
 
+from artman.utils import cache_utils
+from artman.utils import file_utils
+from artman.utils import proto_index
 from artman.utils import protoc_utils
+from artman.utils.logger import logger
 from artman.tasks import task_base
 
 
@@ -39,13 +43,6 @@ class PythonChangePackageTask(task_base.TaskBase):
         '({separator}' + _IDENTIFIER + ')*{package_suffix})'
         '(?P<suffix>{suffix})')
 
-    # E.g., `package google.foo.bar`
-    _PACKAGE_REGEX = re.compile(_BASE_PROTO_REGEX.format(
-        prefix='^package ',
-        separator='\\.',
-        package_suffix='',
-        suffix=''))
-
     # E.g., `import "google/foo/bar";`
     _IMPORT_REGEX = re.compile(_BASE_PROTO_REGEX.format(
         prefix='^import (?:public )?"',
@@ -55,8 +52,11 @@ class PythonChangePackageTask(task_base.TaskBase):
 
     # TODO (geigerj): add regex for documentation link updates?
 
+    # Bump whenever the transform changes, to stop reusing older trees.
+    _CACHE_VERSION = 3
+
     def execute(self, src_proto_path, import_proto_path,
-                organization_name):
+                organization_name, cache_dir=None, scratch_dir=None):
         self._organization_name = organization_name
 
         # Treat google.protobuf, google.iam as a common proto package, even
@@ -74,30 +74,72 @@ class PythonChangePackageTask(task_base.TaskBase):
             'google.logging.type',
         ]
 
-        tmpdir = os.path.join(
-            tempfile.gettempdir(), 'artman-python', str(int(time.time())))
-        new_proto_dir = os.path.join(tmpdir, 'proto')
-        new_src_path = set()
-        new_import_path = [new_proto_dir]
-
-        self._copy_and_transform_directories(
-            src_proto_path, new_proto_dir, common_protos, paths=new_src_path)
-        self._copy_and_transform_directories(
-            import_proto_path, new_proto_dir, common_protos)
+        # The transformed tree only depends on the content of the source
+        # protos and of the files they import, and on the transform rules, so
+        # it is reused across runs with the same inputs. The other files
+        # under the import proto path, e.g. the rest of googleapis, do not
+        # matter.
+        src_protos = sorted(protoc_utils.find_protos(src_proto_path, []))
+        closure = self._import_closure(src_protos, import_proto_path)
+        rules = {
+            'version': self._CACHE_VERSION,
+            'src_proto_path': src_proto_path,
+            'import_proto_path': import_proto_path,
+            'organization_name': organization_name,
+            'common_protos': common_protos,
+        }
+        # The tree of the same rules and paths built from older contents is
+        # superseded by this one; `slot` names them all.
+        slot = cache_utils.digest(rules)
+        key = cache_utils.digest([slot, [
+            [path, cache_utils.file_digest(path)]
+            for path in src_protos + closure]])
+        if cache_dir:
+            tree_dir = cache_utils.entry_path(
+                cache_dir, 'python-protos', slot, suffix='.' + key)
+        else:
+            tree_dir = os.path.join(
+                scratch_dir or tempfile.gettempdir(), 'artman-python',
+                slot + '.' + key)
+        src_paths_file = os.path.join(tree_dir, 'src_paths.json')
+        # Unchanged protos are only hard linked into a tree that is removed
+        # with the run. A tree outlives the run otherwise, and must not share
+        # inodes with the source protos, which may be edited in place.
+        link = bool(scratch_dir) and not cache_dir
+
+        new_src_paths = cache_utils.load_json(src_paths_file)
+        if new_src_paths is None:
+            file_utils.makedirs(os.path.dirname(tree_dir))
+            staging_dir = tempfile.mkdtemp(
+                dir=os.path.dirname(tree_dir), prefix='.tmp-')
+            try:
+                new_proto_dir = os.path.join(staging_dir, 'proto')
+                new_src_path = set()
+                self._copy_and_transform_protos(
+                    src_protos, new_proto_dir, common_protos,
+                    paths=new_src_path, link=link)
+                self._copy_and_transform_protos(
+                    closure, new_proto_dir, common_protos, link=link)
+                new_src_paths = sorted(
+                    os.path.relpath(path, staging_dir)
+                    for path in new_src_path)
+                cache_utils.store_json(
+                    new_src_paths, os.path.join(staging_dir, 'src_paths.json'))
+            except Exception:
+                shutil.rmtree(staging_dir)
+                raise
+            cache_utils.store_dir(staging_dir, tree_dir)
+            self._remove_superseded_trees(tree_dir, slot)
+        else:
+            logger.debug('Reusing transformed protos in %s' % tree_dir)
 
         # Update src_proto_path, import_proto_path
-        return list(new_src_path), new_import_path
+        return ([os.path.join(tree_dir, path) for path in new_src_paths],
+                [os.path.join(tree_dir, 'proto')])
 
     def _extract_base_dirs(self, proto_file):
         """Return the proto file path derived from the package name."""
-
-        with io.open(proto_file, 'rt', encoding='UTF-8') as proto:
-            for line in proto:
-                pkg = self._PACKAGE_REGEX.match(line)
-                if pkg:
-                    pkg = pkg.group('package')
-                    return os.path.sep.join(pkg.split('.'))
-            return ''
+        return os.path.sep.join(proto_index.get(proto_file).package.split('.'))
 
     def _transform(self, pkg, sep, common_protos):
         """Transform to the appropriate proto package layout.
@@ -141,8 +183,21 @@ class PythonChangePackageTask(task_base.TaskBase):
         # Done; return with the appropriate separator.
         return dotted.replace('.', sep) + suffix
 
-    def _copy_proto(self, src, dest, common_protos):
-        """Copies a proto while fixing its imports"""
+    def _copy_proto(self, src, dest, common_protos, link=False):
+        """Copies a proto while fixing its imports.
+
+        A proto without import changes is hard linked if `link` is set, and
+        copied as is otherwise.
+        """
+        info = proto_index.get(src)
+        if not info.public_imports and all(
+                self._transform(import_, '/', common_protos) == import_
+                for import_ in info.imports):
+            if link:
+                file_utils.link_file(src, dest)
+            else:
+                file_utils.copy_file(src, dest)
+            return
         with io.open(src, 'r', encoding='UTF-8') as src_lines:
             with io.open(dest, 'w+', encoding='UTF-8') as dest_file:
                 for line in src_lines:
@@ -154,29 +209,62 @@ class PythonChangePackageTask(task_base.TaskBase):
                     else:
                         dest_file.write(line)
 
-    def _copy_and_transform_directories(
-            self, src_directories, destination_directory, common_protos,
-            paths=None):
-        for path in src_directories:
-            protos = list(protoc_utils.find_protos([path], []))
-            for proto in protos:
-                src_base_dirs = self._extract_base_dirs(proto)
-                sub_new_src = os.path.join(
-                    destination_directory,
-                    self._transform(
-                        src_base_dirs, os.path.sep, common_protos))
-                if paths is not None:
-                    paths.add(sub_new_src)
-
-                dest = os.path.join(sub_new_src, os.path.basename(proto))
-                if not os.path.exists(dest):
-                    self.exec_command(['mkdir', '-p', sub_new_src])
-                self._copy_proto(
-                    proto, os.path.join(sub_new_src, dest), common_protos)
+    def _remove_superseded_trees(self, tree_dir, slot):
+        """Remove the trees built for `slot` from older input protos."""
+        parent_dir = os.path.dirname(tree_dir)
+        for name in os.listdir(parent_dir):
+            path = os.path.join(parent_dir, name)
+            if name.startswith(slot + '.') and path != tree_dir:
+                logger.debug('Removing superseded protos in %s' % path)
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _import_closure(self, protos, import_proto_path):
+        """Return the files imported by `protos`, directly or transitively.
+
+        Imports are resolved against the import proto path like protoc does.
+        Imports that are not found there, e.g. the `google/protobuf` protos
+        bundled with protoc, are skipped. `protos` themselves are excluded.
+        """
+        seen = set(os.path.abspath(proto) for proto in protos)
+        pending = list(protos)
+        closure = []
+        while pending:
+            for import_ in proto_index.get(pending.pop()).imports:
+                for base_dir in import_proto_path:
+                    path = os.path.abspath(os.path.join(base_dir, import_))
+                    if os.path.isfile(path):
+                        break
+                else:
+                    continue
+                if path not in seen:
+                    seen.add(path)
+                    closure.append(path)
+                    pending.append(path)
+        return sorted(closure)
+
+    def _copy_and_transform_protos(
+            self, protos, destination_directory, common_protos, paths=None,
+            link=False):
+        for proto in protos:
+            src_base_dirs = self._extract_base_dirs(proto)
+            sub_new_src = os.path.join(
+                destination_directory,
+                self._transform(
+                    src_base_dirs, os.path.sep, common_protos))
+            if paths is not None:
+                paths.add(sub_new_src)
+
+            dest = os.path.join(sub_new_src, os.path.basename(proto))
+            if not os.path.exists(dest):
+                file_utils.makedirs(sub_new_src)
+            self._copy_proto(
+                proto, os.path.join(sub_new_src, dest), common_protos,
+                link=link)
 
 
 class PythonMoveProtosTask(task_base.TaskBase):
     default_provides = {'grpc_code_dir'}
+    mutates = ('gapic_code_dir',)
 
     def execute(self, grpc_code_dir, gapic_code_dir):
         """Move the protos into the GAPIC structure.
@@ -17,27 +17,48 @@
 This base class extends taskflow Task class, with additional methods and
 properties used by the GAPIC pipeline."""
 
+import collections
+import functools
+import inspect
+import io
 import logging
+import os
 import subprocess
+import threading
 
-from gcloud import logging as cloud_logging
+import six
 
 from taskflow.task import Task
 
+from artman.utils import cache_utils
+from artman.utils import trace_utils
 from artman.utils.logger import logger as artman_logger
 from artman.utils.logger import output_logger
 from artman.utils.logger import OUTPUT
 
+# The number of trailing output lines of a command kept for error reports.
+OUTPUT_TAIL_LINES = 200
 
-class TaskBase(Task):
 
-    cloud_logger = None
+class TaskBase(Task):
+    # The values naming directories the task changes in place, other than
+    # those it provides. The parallel engine does not run such a task
+    # concurrently with the other tasks using these directories.
+    mutates = ()
 
     def __init__(self, *args, **kwargs):
         super(TaskBase, self).__init__(*args, **kwargs)
+        self._trace_start = None
+
+    def pre_execute(self):
+        self._trace_start = trace_utils.now()
+
+    def post_execute(self):
+        trace_utils.record(
+            self.name, 'task', self._trace_start, trace_utils.now())
 
     def log(self, msg, logger=artman_logger, level=logging.INFO):
-        """Do local logging, and optionally cloud logging.
+        """Do local logging.
 
         Args:
             msg (str): The message to be logged.
@@ -47,21 +68,100 @@ class TaskBase(Task):
         """
         logger.log(level, msg)
 
-    def exec_command(self, args):
-        """ Execute command and return output.
+    def exec_command(self, args, cwd=None):
+        """Execute a command, streaming its output to the log.
+
+        Output lines are logged as they arrive, and only the last
+        `OUTPUT_TAIL_LINES` lines are kept in memory. If the command fails,
+        they are attached to the raised `subprocess.CalledProcessError`, and
+        logged as an error unless the output level is enabled, in which case
+        they have been logged already. If the `task_log_dir` pipeline
+        argument is set, the full output is also appended to
+        `<task_log_dir>/<task name>.log`.
 
-        TODO(ethanbao): Use subprocess.Popen which is recommended."""
+        The working directory is passed to the child process rather than
+        changed with ``os.chdir``, so that tasks can run concurrently.
+
+        Returns:
+            str: The last lines of the output.
+        """
+        self.log(' '.join(args), level=logging.DEBUG)
+        log_output = output_logger.isEnabledFor(OUTPUT)
+        tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+        log_file = self._open_task_log(args)
+        start = trace_utils.now()
         try:
-            self.log(' '.join(args), level=logging.DEBUG)
-            output = subprocess.check_output(args, stderr=subprocess.STDOUT)
-            if output:
-                output = output.decode('utf8')
-                self.log(output, logger=output_logger, level=OUTPUT)
-            return output
-        except subprocess.CalledProcessError as e:
-            self.log(e.output.decode('utf8'), logger=output_logger,
-                     level=logging.ERROR)
-            raise e
+            process = subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                cwd=cwd)
+            with process.stdout:
+                for line in iter(process.stdout.readline, b''):
+                    tail.append(line)
+                    if log_file:
+                        log_file.write(line)
+                    if log_output:
+                        self.log(line.decode('utf8', 'replace').rstrip(),
+                                 logger=output_logger, level=OUTPUT)
+            returncode = process.wait()
+        finally:
+            if log_file:
+                log_file.close()
+            trace_utils.record(os.path.basename(args[0]), 'command', start,
+                               trace_utils.now(), {'args': ' '.join(args)})
+        output = b''.join(tail)
+        if returncode:
+            if not log_output:
+                # Otherwise the lines have been logged already.
+                self.log(output.decode('utf8', 'replace'),
+                         logger=output_logger, level=logging.ERROR)
+            raise subprocess.CalledProcessError(returncode, args, output)
+        return output.decode('utf8', 'replace')
+
+    def log_command_output(self, args, output, returncode):
+        """Log the output of a command run without `exec_command`, e.g. in
+        this process, the way `exec_command` does.
+
+        Args:
+            args (list): The command line.
+            output (bytes): The whole output of the command.
+            returncode (int): The exit status of the command.
+
+        Returns:
+            str: The last lines of the output.
+
+        Raises:
+            subprocess.CalledProcessError: If `returncode` is not zero.
+        """
+        log_output = output_logger.isEnabledFor(OUTPUT)
+        lines = output.splitlines(True)
+        log_file = self._open_task_log(args)
+        if log_file:
+            with log_file:
+                log_file.write(output)
+        if log_output:
+            for line in lines:
+                self.log(line.decode('utf8', 'replace').rstrip(),
+                         logger=output_logger, level=OUTPUT)
+        tail = b''.join(lines[-OUTPUT_TAIL_LINES:])
+        if returncode:
+            if not log_output:
+                self.log(tail.decode('utf8', 'replace'),
+                         logger=output_logger, level=logging.ERROR)
+            raise subprocess.CalledProcessError(returncode, args, tail)
+        return tail.decode('utf8', 'replace')
+
+    def _open_task_log(self, args):
+        log_dir = (self.inject or {}).get('task_log_dir')
+        if not log_dir:
+            return None
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        # Unbuffered, so that lines of concurrent commands of a task are
+        # appended whole.
+        log_file = io.open(
+            os.path.join(log_dir, self.name + '.log'), 'ab', buffering=0)
+        log_file.write(('$ %s\n' % ' '.join(args)).encode('utf8'))
+        return log_file
 
 
 class EmptyTask(TaskBase):
@@ -73,3 +173,162 @@ class EmptyTask(TaskBase):
 
     def validate(self):
         return []
+
+
+# Directory under `output_dir` holding the incremental execution manifests.
+INCREMENTAL_DIR = cache_utils.INCREMENTAL_DIR
+
+# Incremental task runs of this process that are not recorded yet, keyed by
+# manifest path.
+_pending_runs = {}
+_pending_lock = threading.Lock()
+
+
+def incremental(*path_args):
+    """Decorator for the `execute` method of tasks that can be skipped.
+
+    In incremental mode (the `incremental` pipeline argument), a task is
+    fingerprinted by its argument values and by the files and directories
+    named by the `path_args` arguments. Every string in its result is taken
+    as an output path. If the fingerprint and the outputs are the same as at
+    the end of the last successful run, the task is skipped and returns its
+    previous result.
+
+    Runs are recorded in manifests under `output_dir` by
+    `RecordIncrementalRunsTask` once the whole pipeline has succeeded, so
+    that later tasks changing the outputs in place (e.g. formatters) do not
+    make the next run miss. The inputs are fingerprinted before the task
+    runs though, so that an input edited meanwhile makes the next run redo
+    the task. Paths under the per-run `scratch_dir` are recorded relative to
+    it, so that they match across runs.
+    """
+    def decorator(execute):
+        signature = inspect.signature(execute)
+
+        @functools.wraps(execute)
+        def wrapper(self, *args, **kwargs):
+            inject = self.inject or {}
+            if not inject.get('incremental') or not inject.get('output_dir'):
+                return execute(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments['self']
+            scratch_dir = inject.get('scratch_dir')
+            manifest = os.path.join(
+                inject['output_dir'], INCREMENTAL_DIR, '%s-%s.json' % (
+                    self.name, cache_utils.digest(
+                        _key_arguments(arguments, scratch_dir))[:16]))
+
+            inputs = _input_digest(arguments, path_args, scratch_dir)
+            entry = cache_utils.load_json(manifest)
+            if entry and entry == _run_entry(inputs, entry.get('result')):
+                artman_logger.info(
+                    'Skipping %s, its inputs and outputs are unchanged.' %
+                    self.name)
+                result = entry['result']
+            else:
+                if entry is not None:
+                    os.remove(manifest)
+                result = execute(self, *args, **kwargs)
+            with _pending_lock:
+                _pending_runs[manifest] = (inputs, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def record_incremental_runs(output_dir):
+    """Write the manifests of the incremental task runs into `output_dir`."""
+    prefix = os.path.join(output_dir, INCREMENTAL_DIR) + os.sep
+    with _pending_lock:
+        runs = [(manifest, _pending_runs.pop(manifest))
+                for manifest in list(_pending_runs)
+                if manifest.startswith(prefix)]
+    for manifest, (inputs, result) in runs:
+        entry = _run_entry(inputs, result)
+        if entry is None:
+            # Some output is gone, e.g. moved by a later task, so the
+            # task has to run again next time.
+            continue
+        try:
+            cache_utils.store_json(entry, manifest)
+        except (TypeError, ValueError):
+            # The result cannot be stored.
+            continue
+
+
+def _key_arguments(arguments, scratch_dir):
+    """Return the arguments of a task run with the paths under the scratch
+    directory, which is new for every run, made relative to it."""
+    if not scratch_dir:
+        return arguments
+    prefix = os.path.join(scratch_dir, '')
+
+    def relative(value):
+        if isinstance(value, six.string_types):
+            if value == scratch_dir:
+                return '<scratch>'
+            if value.startswith(prefix):
+                return os.path.join('<scratch>', value[len(prefix):])
+            return value
+        if isinstance(value, dict):
+            return dict((key, relative(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return [relative(item) for item in value]
+        return value
+
+    return relative(arguments)
+
+
+def _input_digest(arguments, path_args, scratch_dir=None):
+    """Return the fingerprint of the arguments of a task run and of the
+    files named by its `path_args` arguments."""
+    key_arguments = _key_arguments(arguments, scratch_dir)
+    inputs = dict(key_arguments)
+    for name in path_args:
+        paths = arguments.get(name)
+        if isinstance(paths, six.string_types):
+            inputs[name] = [key_arguments[name],
+                            cache_utils.path_digest(paths)]
+        elif paths:
+            inputs[name] = [[key_path, cache_utils.path_digest(path)]
+                            for key_path, path in zip(
+                                key_arguments[name], paths)]
+    return cache_utils.digest(inputs)
+
+
+def _run_entry(inputs, result):
+    """Return the manifest entry of a task run with the `inputs` digest, or
+    None if an output is missing."""
+    outputs = {}
+    for path in _strings(result):
+        digest = cache_utils.path_digest(path)
+        if digest is None:
+            return None
+        outputs[path] = digest
+    return {
+        'inputs': inputs,
+        'outputs': outputs,
+        'result': result,
+    }
+
+
+def _strings(value):
+    if isinstance(value, six.string_types):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            for string in _strings(item):
+                yield string
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for string in _strings(item):
+                yield string
+
+
+class RecordIncrementalRunsTask(TaskBase):
+    """Records the incremental task runs of a pipeline that succeeded."""
+
+    def execute(self, output_dir):
+        record_incremental_runs(output_dir)
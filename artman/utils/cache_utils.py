@@ -0,0 +1,147 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Utilities for the on-disk cache shared by artman tasks.
+
+Cache entries are content addressed: they are stored under a key computed
+from everything that affects their content, so stale entries are never
+reused and need no invalidation.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+DEFAULT_CACHE_DIR = '~/.cache/artman'
+# The directory under the output directory that records the task runs
+# `--incremental` can skip, see `artman.tasks.task_base.incremental`.
+INCREMENTAL_DIR = '.artman-incremental'
+
+
+def file_digest(path):
+    """Return the hex SHA-256 digest of a file's content."""
+    sha = hashlib.sha256()
+    with io.open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def digest(value):
+    """Return the hex SHA-256 digest of a JSON-serializable value.
+
+    Values that JSON cannot represent are digested by their `repr`.
+    """
+    blob = json.dumps(value, sort_keys=True, separators=(',', ':'),
+                      default=repr)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def path_digest(path):
+    """Return a digest of a file or directory tree, or None if it is missing.
+
+    Files are digested by content. Directory trees are digested by the
+    relative path, size and modification time of their files, which is much
+    faster on large trees; hidden directories such as `.git` are skipped.
+    """
+    if os.path.isfile(path):
+        return file_digest(path)
+    if not os.path.isdir(path):
+        return None
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append([os.path.relpath(file_path, path),
+                            stat.st_size, stat.st_mtime_ns])
+    return digest(entries)
+
+
+def entry_path(cache_dir, namespace, key, suffix=''):
+    """Return the location of a cache entry.
+
+    Args:
+        cache_dir (str): The cache root, `~` is expanded.
+        namespace (str): The kind of entry, e.g. `descriptors`.
+        key (str): The digest the entry is keyed on.
+        suffix (str): An optional file name suffix.
+    """
+    return os.path.join(
+        os.path.expanduser(cache_dir), namespace, key[:2], key + suffix)
+
+
+def store_file(src, dest):
+    """Copy a file into the cache atomically.
+
+    The file is first copied next to `dest` and then renamed, so concurrent
+    readers see either no entry or a complete one.
+    """
+    dest_dir = os.path.dirname(dest)
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix='.tmp-')
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def store_json(value, dest):
+    """Write a JSON value into the cache atomically."""
+    dest_dir = os.path.dirname(dest)
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, prefix='.tmp-')
+    try:
+        with io.open(fd, 'w', encoding='UTF-8') as f:
+            f.write(json.dumps(value, sort_keys=True))
+        os.replace(tmp, dest)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def store_dir(src_dir, dest):
+    """Move a fully built directory into the cache atomically.
+
+    `src_dir` must be on the same file system as `dest`, e.g. created with
+    `tempfile.mkdtemp(dir=os.path.dirname(dest))`. If another process stored
+    the entry first, its copy is kept and `src_dir` is removed.
+    """
+    try:
+        os.rename(src_dir, dest)
+    except OSError:
+        if not os.path.isdir(dest):
+            raise
+        shutil.rmtree(src_dir)
+
+
+def load_json(path):
+    """Read a JSON value from the cache, or None if there is no entry."""
+    try:
+        with io.open(path, encoding='UTF-8') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
@@ -0,0 +1,164 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process file operations used by the copy and move tasks.
+
+These replace `mkdir -p`, `cp`, `cp -rf` and `mv` subprocesses, which cost
+a fork and exec per file. File contents are copied in the kernel where
+possible, and large batches of files are copied by several threads.
+Read-only copies can be hard links instead.
+"""
+
+import errno
+import os
+import shutil
+
+from concurrent import futures
+
+# Batches with fewer files than this are copied by the calling thread.
+PARALLEL_THRESHOLD = 64
+MAX_WORKERS = 8
+
+# Errors meaning that the in-kernel copy is not supported for a pair of
+# files, e.g. because they live on different file systems.
+_UNSUPPORTED_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP,
+                       errno.EBADF, errno.EOPNOTSUPP)
+
+
+def makedirs(path):
+    """Create a directory and its parents, like `mkdir -p`."""
+    if path and not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+
+
+def copy_file(src, dest):
+    """Copy the content and mode of file `src` to `dest`, like `cp`.
+
+    An existing `dest` file is overwritten.
+    """
+    with open(src, 'rb') as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        with open(dest, 'wb') as fdest:
+            if not _kernel_copy(fsrc.fileno(), fdest.fileno(), size):
+                fsrc.seek(0)
+                fdest.seek(0)
+                fdest.truncate()
+                shutil.copyfileobj(fsrc, fdest, 1 << 20)
+    shutil.copymode(src, dest)
+
+
+def link_file(src, dest):
+    """Place file `src` at `dest` with a hard link, or copy it if the file
+    system does not allow one, e.g. across devices.
+
+    The copy itself shares the data blocks where the file system supports
+    reflinks through copy_file_range. Only use this for files that are not
+    modified in place afterwards, as a hard link shares its content with
+    `src`. An existing `dest` file is replaced.
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        copy_file(src, dest)
+
+
+def copy_files(pairs):
+    """Copy many files, creating the destination directories as needed.
+
+    Args:
+        pairs (iterable): (src, dest) file path tuples.
+    """
+    pairs = list(pairs)
+    for dest_dir in sorted(set(os.path.dirname(dest) for _, dest in pairs)):
+        makedirs(dest_dir)
+    if len(pairs) < PARALLEL_THRESHOLD:
+        for src, dest in pairs:
+            copy_file(src, dest)
+        return
+    with futures.ThreadPoolExecutor(MAX_WORKERS) as executor:
+        # Consume the results so that the first error is raised.
+        for _ in executor.map(lambda pair: copy_file(*pair), pairs):
+            pass
+
+
+def copy_tree(src, dest_dir):
+    """Copy a file or directory into `dest_dir`, like `cp -rf src dest_dir`.
+
+    Files already in the destination are overwritten, others are kept.
+    Symbolic links inside `src`, to files or directories, are recreated as
+    such, as `cp -r` does.
+    """
+    dest = os.path.join(dest_dir, os.path.basename(os.path.normpath(src)))
+    if not os.path.isdir(src):
+        makedirs(dest_dir)
+        copy_file(src, dest)
+        return
+    pairs = []
+    for root, dirs, files in os.walk(src):
+        target = os.path.join(dest, os.path.relpath(root, src))
+        makedirs(target)
+        # os.walk lists symlinked directories in `dirs`, without following
+        # them.
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                copy_symlink(path, os.path.join(target, name))
+            elif name in files:
+                pairs.append((path, os.path.join(target, name)))
+    copy_files(pairs)
+
+
+def copy_symlink(src, dest):
+    """Create at `dest` a symbolic link with the same target as the link
+    `src`, replacing an existing file or link."""
+    if os.path.islink(dest) or os.path.isfile(dest):
+        os.remove(dest)
+    os.symlink(os.readlink(src), dest)
+
+
+def move(src, dest):
+    """Move a file or directory, like `mv`.
+
+    This is a rename whenever `src` and `dest` are on the same file system.
+    """
+    shutil.move(src, dest)
+
+
+def _kernel_copy(src_fd, dest_fd, size):
+    """Copy `size` bytes between file descriptors without going through
+    user space. Returns False if neither copy_file_range nor sendfile can be
+    used for these files, in which case nothing was copied."""
+    for copy_fn in (getattr(os, 'copy_file_range', None),
+                    getattr(os, 'sendfile', None)):
+        if copy_fn is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                if copy_fn is os.sendfile:
+                    sent = copy_fn(dest_fd, src_fd, offset, size - offset)
+                else:
+                    sent = copy_fn(src_fd, dest_fd, size - offset,
+                                   offset, offset)
+                if not sent:
+                    break
+                offset += sent
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS or offset:
+                raise
+            continue
+        return True
+    return False
@@ -0,0 +1,313 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Long-lived JVM for running gapic-generator.
+
+Every gapic-generator task normally starts a new JVM. When enabled with a
+Nailgun server jar, the generator fat jar is instead loaded once into a
+Nailgun server listening on localhost, and each task runs the generator
+through the `ng` client. Whenever the client or the server is unavailable,
+the plain `java` command is used.
+
+Each server runs under a small watchdog process, which stops it after
+`IDLE_TIMEOUT_SECS` without use, and on `artman daemon stop`. Later runs
+reuse a server through a state file in the cache directory, once they have
+checked that the recorded watchdog is still alive and is ours.
+
+A server only runs one generator at a time, and runs it in the working
+directory it was started in: the servers are keyed on the working directory,
+and concurrent tasks, of this process or of another artman process, each
+claim a server of their own.
+
+Nailgun has no authentication: any local user who can connect to the port
+can run code in the server, as the user who started it. The daemon is only
+meant for single-user machines.
+"""
+
+import io
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from artman.utils import cache_utils
+from artman.utils.logger import logger
+
+NG_CLIENT = 'ng'
+IDLE_TIMEOUT_SECS = 30 * 60
+_SERVER_CLASSES = (
+    'com.facebook.nailgun.NGServer',
+    'com.martiansoftware.nailgun.NGServer',
+)
+_STARTUP_TIMEOUT_SECS = 60
+_WATCH_INTERVAL_SECS = 10
+
+_nailgun_jar = None
+_state_dir = None
+_ports = {}
+_lock = threading.Lock()
+# The server slots claimed by each thread, see `_claim_slot`.
+_claims = threading.local()
+
+
+def enable(nailgun_jar, cache_dir=cache_utils.DEFAULT_CACHE_DIR):
+    """Run gapic-generator in a Nailgun server loaded from `nailgun_jar`."""
+    global _nailgun_jar, _state_dir
+    _nailgun_jar = os.path.abspath(os.path.expanduser(nailgun_jar))
+    _state_dir = state_dir(cache_dir)
+
+
+def state_dir(cache_dir=cache_utils.DEFAULT_CACHE_DIR):
+    """Return the directory of the server state files."""
+    return os.path.join(
+        os.path.expanduser(cache_dir or cache_utils.DEFAULT_CACHE_DIR),
+        'generator-daemon')
+
+
+def command(classpath, main_class, args, cwd=None):
+    """Return a command running `main_class` in the warm JVM.
+
+    Args:
+        classpath (str): The jar of `main_class`.
+        main_class (str): The class to run.
+        args (list): The arguments of `main_class`.
+        cwd (str): The directory relative paths in `args` are resolved
+            against; defaults to the current working directory.
+
+    Returns:
+        list: The `ng` command line, or None if the daemon is not enabled or
+            could not be started.
+    """
+    if not _nailgun_jar or not fcntl or not shutil.which(NG_CLIENT):
+        return None
+    cwd = os.path.abspath(cwd or os.getcwd())
+    stat = os.stat(classpath)
+    key = cache_utils.digest(
+        [classpath, stat.st_size, stat.st_mtime, _nailgun_jar, cwd])
+    name = '%s-%d' % (key, _claim_slot(key))
+    with _lock:
+        # A server may have been stopped since, e.g. for being idle.
+        if name not in _ports or (
+                _ports[name] and not _is_listening(_ports[name])):
+            _ports[name] = _ensure_server(classpath, cwd, name)
+        port = _ports[name]
+    if port is None:
+        return None
+    # Record the use, which the watchdog reads to find idle servers.
+    _touch(os.path.join(_state_dir, name + '.json'))
+    return [NG_CLIENT, '--nailgun-port', str(port), main_class] + args
+
+
+def stop_all(cache_dir=cache_utils.DEFAULT_CACHE_DIR):
+    """Stop the servers started with the state files in `cache_dir`.
+
+    Returns:
+        int: The number of servers stopped.
+    """
+    directory = state_dir(cache_dir)
+    if not os.path.isdir(directory):
+        return 0
+    stopped = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        state_file = os.path.join(directory, name)
+        state = cache_utils.load_json(state_file)
+        if state and _is_ours(state, state_file):
+            try:
+                os.kill(state['pid'], signal.SIGTERM)
+                stopped += 1
+            except OSError:
+                pass
+        _remove(state_file)
+    return stopped
+
+
+def _claim_slot(key):
+    """Return the server slot of `key` this thread runs its nails in.
+
+    A slot is claimed with an exclusive lock on its lock file, which is held
+    until the thread, or the process, ends. Concurrent tasks therefore get
+    distinct slots, and distinct servers.
+    """
+    claims = getattr(_claims, 'slots', None)
+    if claims is None:
+        claims = _claims.slots = {}
+    if key not in claims:
+        if not os.path.isdir(_state_dir):
+            os.makedirs(_state_dir, mode=0o700, exist_ok=True)
+        slot = 0
+        while True:
+            lock_file = io.open(os.path.join(
+                _state_dir, '%s-%d.lock' % (key, slot)), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                lock_file.close()
+                slot += 1
+                continue
+            claims[key] = (slot, lock_file)
+            break
+    return claims[key][0]
+
+
+def _ensure_server(classpath, cwd, name):
+    """Return the port of a running server for `classpath`, starting one if
+    needed. Returns None if the server cannot be started."""
+    state_file = os.path.join(_state_dir, name + '.json')
+    state = cache_utils.load_json(state_file)
+    if state and _is_ours(state, state_file) and _is_listening(state['port']):
+        return state['port']
+
+    server_class = _server_class(_nailgun_jar)
+    if not server_class:
+        logger.warning('No Nailgun server found in %s; running '
+                       'gapic-generator without the daemon.' % _nailgun_jar)
+        return None
+    port = _free_port()
+    logger.info('Starting gapic-generator daemon on port %d.' % port)
+    server_cmd = ['java', '-cp', os.pathsep.join([_nailgun_jar, classpath]),
+                  server_class, '127.0.0.1:%d' % port]
+    with io.open(os.devnull, 'wb') as devnull:
+        watchdog = subprocess.Popen(
+            [sys.executable, '-m', 'artman.utils.generator_daemon',
+             state_file, str(IDLE_TIMEOUT_SECS)] + server_cmd,
+            cwd=cwd, stdout=devnull, stderr=devnull, start_new_session=True)
+    deadline = time.time() + _STARTUP_TIMEOUT_SECS
+    while not _is_listening(port):
+        if time.time() > deadline or watchdog.poll() is not None:
+            logger.warning('gapic-generator daemon did not start; running '
+                           'gapic-generator without the daemon.')
+            if watchdog.poll() is None:
+                watchdog.terminate()
+            return None
+        time.sleep(0.2)
+    cache_utils.store_json({'port': port, 'pid': watchdog.pid}, state_file)
+    logger.info('gapic-generator daemon is up. It stops after %d minutes '
+                'without use, or with `artman daemon stop`.'
+                % (IDLE_TIMEOUT_SECS // 60))
+    return port
+
+
+def _is_ours(state, state_file):
+    """Return whether the watchdog recorded in a state file is still running.
+
+    Where the process table can be read, the watchdog must also have been
+    started for this state file, so that a recycled pid is not trusted.
+    """
+    try:
+        pid = int(state['pid'])
+        int(state['port'])
+        os.kill(pid, 0)
+    except (KeyError, TypeError, ValueError, OSError):
+        return False
+    try:
+        with io.open('/proc/%d/cmdline' % pid, 'rb') as f:
+            cmdline = f.read().split(b'\0')
+    except (IOError, OSError):
+        return True
+    return state_file.encode('utf-8') in cmdline
+
+
+def _watch(state_file, idle_timeout, server_cmd):
+    """Run a server until it has not been used for `idle_timeout` seconds, or
+    until this process is terminated."""
+    server = subprocess.Popen(server_cmd)
+    signal.signal(signal.SIGTERM, _raise_stop)
+    start = time.time()
+    try:
+        while server.poll() is None:
+            time.sleep(min(_WATCH_INTERVAL_SECS, idle_timeout))
+            try:
+                last_use = max(start, os.stat(state_file).st_mtime)
+            except OSError:
+                last_use = start
+            if time.time() - last_use > idle_timeout:
+                break
+    except _Stop:
+        pass
+    if server.poll() is None:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    state = cache_utils.load_json(state_file)
+    if state and state.get('pid') == os.getpid():
+        _remove(state_file)
+
+
+class _Stop(Exception):
+    pass
+
+
+def _raise_stop(signum, frame):
+    raise _Stop()
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _server_class(nailgun_jar):
+    try:
+        with zipfile.ZipFile(nailgun_jar) as jar:
+            names = set(jar.namelist())
+    except (IOError, OSError, zipfile.BadZipfile):
+        return None
+    for server_class in _SERVER_CLASSES:
+        if server_class.replace('.', '/') + '.class' in names:
+            return server_class
+    return None
+
+
+def _is_listening(port):
+    try:
+        socket.create_connection(('127.0.0.1', port), timeout=1).close()
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _free_port():
+    sock = socket.socket()
+    try:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    _watch(sys.argv[1], float(sys.argv[2]), sys.argv[3:])
@@ -55,7 +55,7 @@ def setup_logging(level=logging.DEBUG):  # pragma: no cover
     setup_logger(None, level)
     setup_logger('artman.output', level + 5,
         colors=dict(COLORS, OUTPUT='green'),
-        format_string="%(log_color)s%(name)s >\n%(white)s%(message)s",
+        format_string="%(log_color)s%(name)s> %(white)s%(message)s",
     )
     setup_logger('github3', level + 10, colors=dict(COLORS, INFO='blue'))
     setup_logger('sh', logging.WARNING)
@@ -0,0 +1,131 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Index of the metadata of .proto files.
+
+Each file is parsed once for its package, imports and file options. The
+results are kept by path, modification time and size, so a file is parsed
+again only after it changes. Once enabled with a cache directory, the index
+is loaded from and saved to that directory, and survives across runs.
+"""
+
+import collections
+import io
+import os
+import re
+import threading
+
+from artman.utils import cache_utils
+
+ProtoInfo = collections.namedtuple('ProtoInfo', [
+    'package',         # The proto package, e.g. `google.pubsub.v1`.
+    'go_package',      # The Go import path, without the nickname.
+    'imports',         # All imported files, in order.
+    'public_imports',  # The files imported with `import public`.
+    'options',         # File option names mapped to their values.
+])
+
+_PACKAGE_RE = re.compile(r'^package\s+(?P<package>[A-Za-z_][\w.]*)\s*;')
+_IMPORT_RE = re.compile(
+    r'^import\s+(?:(?P<kind>public|weak)\s+)?"(?P<path>[^"]+)"\s*;')
+_OPTION_RE = re.compile(
+    r'^option\s+(?P<name>[\w.()]+)\s*=\s*'
+    r'(?P<value>"(?:[^"\\]|\\.)*"|[^;]*?)\s*;')
+
+# Bump whenever the parsing changes, to drop indexes saved by older versions.
+_VERSION = 1
+
+_index_path = None
+_entries = None
+_dirty = False
+_lock = threading.Lock()
+
+
+def enable(cache_dir):
+    """Persist the index in `cache_dir` across runs."""
+    global _index_path, _entries
+    with _lock:
+        _index_path = os.path.join(
+            os.path.expanduser(cache_dir), 'proto-index.json')
+        _entries = None
+
+
+def get(proto_file):
+    """Return the ProtoInfo of a .proto file."""
+    global _dirty
+    path = os.path.abspath(proto_file)
+    stat = os.stat(path)
+    key = [stat.st_mtime_ns, stat.st_size]
+    with _lock:
+        entries = _load()
+        entry = entries.get(path)
+        if entry and entry[0] == key:
+            return ProtoInfo(*entry[1])
+    info = _parse(path)
+    with _lock:
+        _load()[path] = [key, list(info)]
+        _dirty = True
+    return info
+
+
+def save():
+    """Write the index to the cache directory, if it changed."""
+    global _dirty
+    with _lock:
+        if not _index_path or not _dirty:
+            return
+        cache_utils.store_json(
+            {'version': _VERSION, 'entries': _entries}, _index_path)
+        _dirty = False
+
+
+def _load():
+    global _entries
+    if _entries is None:
+        saved = cache_utils.load_json(_index_path) if _index_path else None
+        if saved and saved.get('version') == _VERSION:
+            _entries = saved['entries']
+        else:
+            _entries = {}
+    return _entries
+
+
+def _parse(path):
+    package = ''
+    imports = []
+    public_imports = []
+    options = {}
+    with io.open(path, encoding='UTF-8') as f:
+        for line in f:
+            if line.startswith('package'):
+                match = _PACKAGE_RE.match(line)
+                if match and not package:
+                    package = match.group('package')
+            elif line.startswith('import'):
+                match = _IMPORT_RE.match(line)
+                if match:
+                    imports.append(match.group('path'))
+                    if match.group('kind') == 'public':
+                        public_imports.append(match.group('path'))
+            elif line.startswith('option'):
+                match = _OPTION_RE.match(line)
+                if match:
+                    value = match.group('value')
+                    if value.startswith('"'):
+                        value = value[1:-1]
+                    options.setdefault(match.group('name'), value)
+    # The syntax is `option go_package = "path/to/package;nickname";`, where
+    # the nickname is optional.
+    go_package = options.get('go_package', '').split(';')[0]
+    return ProtoInfo(package, go_package, imports, public_imports, options)
@@ -0,0 +1,173 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runners for protoc command lines.
+
+The protoc tasks build full command lines, e.g.
+`[sys.executable, '-m', 'grpc_tools.protoc', ...]` for Python. `get` picks
+the runner for one: `python -m grpc_tools.protoc` is run in this process by
+calling `grpc_tools.protoc.main`, which saves an interpreter startup per
+call; every other command, such as the versioned protoc binaries of the other
+languages, runs as a subprocess.
+
+The standard error of the process is redirected during an in-process call,
+which would capture the output of every other thread too. So protoc only
+runs in process while no other thread runs, e.g. not under the parallel
+engine or `generate-all`.
+"""
+
+import contextlib
+import importlib.util
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from artman.utils import trace_utils
+
+GRPC_TOOLS_COMMAND = [sys.executable, '-m', 'grpc_tools.protoc']
+
+# protoc keeps process-wide state, such as the generator registry, so
+# in-process runs are serialized.
+_in_process_lock = threading.Lock()
+
+
+class ProtocRunner(object):
+    """Runs protoc command lines on behalf of a task."""
+
+    def run(self, task, args):
+        """Run a protoc command line.
+
+        Args:
+            task (artman.tasks.task_base.TaskBase): The task running protoc,
+                used for logging.
+            args (list): The command line, including the compiler command.
+
+        Raises:
+            subprocess.CalledProcessError: If protoc fails.
+        """
+        raise NotImplementedError('Subclass must implement abstract method')
+
+
+class SubprocessProtocRunner(ProtocRunner):
+    """Runs protoc as a subprocess, with its output streamed to the log."""
+
+    def run(self, task, args):
+        task.exec_command(args)
+
+
+class InProcessProtocRunner(ProtocRunner):
+    """Runs `python -m grpc_tools.protoc` command lines in this process.
+
+    The arguments are passed to `grpc_tools.protoc.main` along with the
+    include path of the well-known protos, as `python -m grpc_tools.protoc`
+    does. protoc writes its diagnostics to the standard error of this
+    process, which is captured during the call and then logged by the task
+    like the output of `exec_command`.
+    """
+
+    def run(self, task, args):
+        from grpc_tools import protoc
+        argv = ['grpc_tools.protoc'] + args[len(GRPC_TOOLS_COMMAND):] + [
+            '-I' + os.path.join(os.path.dirname(protoc.__file__), '_proto')]
+        task.log(' '.join(args), level=logging.DEBUG)
+        with trace_utils.span('grpc_tools.protoc', 'command',
+                              {'args': ' '.join(args)}):
+            with _in_process_lock, tempfile.TemporaryFile() as output:
+                with _redirect_stderr(output):
+                    returncode = protoc.main(argv)
+                output.seek(0)
+                task.log_command_output(args, output.read(), returncode)
+
+
+@contextlib.contextmanager
+def _redirect_stderr(output):
+    """Redirect the standard error file descriptor of this process to the
+    file `output`.
+
+    The log handlers writing to standard error are pointed at a copy of the
+    original descriptor meanwhile, so that the log records of other threads
+    are not captured.
+    """
+    sys.stderr.flush()
+    saved_fd = os.dup(2)
+    saved = io.open(saved_fd, 'w', closefd=False)
+    streams = dict((handler, handler.stream)
+                   for handler in _stream_handlers()
+                   if _is_stderr(handler.stream))
+    for handler in streams:
+        handler.acquire()
+    try:
+        for handler in streams:
+            handler.flush()
+            handler.stream = saved
+        os.dup2(output.fileno(), 2)
+    finally:
+        for handler in streams:
+            handler.release()
+    try:
+        yield
+    finally:
+        os.dup2(saved_fd, 2)
+        for handler, stream in streams.items():
+            handler.acquire()
+            try:
+                handler.flush()
+                handler.stream = stream
+            finally:
+                handler.release()
+        saved.close()
+        os.close(saved_fd)
+
+
+def _stream_handlers():
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)]
+    return set(handler for logger in loggers for handler in logger.handlers
+               if isinstance(handler, logging.StreamHandler))
+
+
+def _is_stderr(stream):
+    try:
+        return stream.fileno() == 2
+    except (AttributeError, ValueError, io.UnsupportedOperation):
+        return False
+
+
+_SUBPROCESS_RUNNER = SubprocessProtocRunner()
+_IN_PROCESS_RUNNER = InProcessProtocRunner()
+
+
+def get(args):
+    """Return the runner for a protoc command line."""
+    if (args[:len(GRPC_TOOLS_COMMAND)] == GRPC_TOOLS_COMMAND and
+            threading.active_count() == 1 and _has_grpc_tools()):
+        return _IN_PROCESS_RUNNER
+    return _SUBPROCESS_RUNNER
+
+
+def run(task, args):
+    """Run a protoc command line with the runner returned by `get`."""
+    get(args).run(task, args)
+
+
+def _has_grpc_tools():
+    try:
+        return importlib.util.find_spec('grpc_tools.protoc') is not None
+    except ImportError:
+        return False
@@ -15,16 +15,23 @@
 """Utilities for protoc tasks"""
 
 import collections.abc
+from concurrent import futures
+import importlib.util
 import io
 import os
 import re
+import shutil
 import subprocess
 import types
-import sys
 
+from google.protobuf import descriptor_pb2
 import six
 
+from artman.utils import cache_utils
+from artman.utils import file_utils
 from artman.utils import lang_params
+from artman.utils import proto_index
+from artman.utils import protoc_runner
 from artman.utils import task_utils
 from artman.utils.logger import logger
 
@@ -190,7 +197,7 @@ class _PythonProtoParams(_SimpleProtoParams):
 
     @property
     def proto_compiler_command(self):
-        return [sys.executable, '-m', 'grpc_tools.protoc']
+        return list(protoc_runner.GRPC_TOOLS_COMMAND)
 
 
 def protoc_binary_name(language):
@@ -232,25 +239,9 @@ def group_by_go_package(proto_files):
         A dict mapping go_package to the list of proto files in the package.
     """
 
-    def go_pkg(file):
-        prefix = 'option go_package ='
-        with open(file, encoding='utf-8') as f:
-            for line in f:
-                if line.startswith(prefix):
-                    # syntax is: option go_package = "path/to/package;nickname";
-                    # the nickname is optional
-                    line = line[len(prefix):]
-                    line = line.strip().strip('";')
-                    # find the nickname
-                    semi = line.find(';')
-                    if semi >= 0:
-                        line = line[:semi]
-                    return line
-        return ""
-
     pkgs = {}
     for file in proto_files:
-        pkg = go_pkg(file)
+        pkg = proto_index.get(file).go_package
         pkgs.setdefault(pkg, []).append(file)
 
     return pkgs
@@ -316,6 +307,162 @@ def protoc_common_resources_params(root_dir, common_resources=None):
     return (common_resources_includes, common_resources_paths)
 
 
+def descriptor_set_cache_key(params, proto_files):
+    """Return the key of a descriptor set in the cache.
+
+    The key covers the compiler, its arguments other than the output file,
+    and the content of the proto files given on the command line. Files that
+    protoc finds through the include path are checked separately, see
+    `fetch_cached_descriptor_set`.
+
+    The key is made of two digests separated by a dot. The first one, the
+    slot, leaves out the proto contents, so that an entry built from older
+    protos can be found and removed by `store_cached_descriptor_set`.
+
+    Args:
+        params (list): The protoc command line.
+        proto_files (list): The proto files named on the command line.
+    """
+    args = []
+    skip = False
+    for param in params:
+        if skip:
+            skip = False
+        elif param == '-o':
+            skip = True
+        else:
+            args.append(param)
+    slot = cache_utils.digest({
+        'compiler': _compiler_identity(params),
+        'args': args,
+    })
+    return slot + '.' + cache_utils.digest(
+        [cache_utils.file_digest(p) for p in proto_files])
+
+
+def fetch_cached_descriptor_set(cache_dir, key, params, desc_out_path):
+    """Copy a cached descriptor set to `desc_out_path`.
+
+    Returns:
+        bool: Whether the cache had an entry whose imported files are
+            unchanged.
+    """
+    manifest = cache_utils.load_json(
+        cache_utils.entry_path(cache_dir, 'descriptors', key, '.json'))
+    if manifest is None:
+        return False
+    include_paths = _include_paths(params)
+    for name, expected in manifest.items():
+        path = _resolve_proto(name, include_paths)
+        actual = cache_utils.file_digest(path) if path else None
+        if actual != expected:
+            return False
+    cached = cache_utils.entry_path(cache_dir, 'descriptors', key, '.desc')
+    if not os.path.isfile(cached):
+        return False
+    shutil.copyfile(cached, desc_out_path)
+    return True
+
+
+def store_cached_descriptor_set(cache_dir, key, params, desc_out_path):
+    """Add a descriptor set produced by protoc to the cache.
+
+    Along with the descriptor set, a manifest records the digest of every
+    file it was built from, as resolved through the include paths, so that
+    a changed import invalidates the entry. The entries of the same slot
+    built from older protos are removed, so that the cache does not grow
+    with every change of the protos.
+    """
+    desc_set = descriptor_pb2.FileDescriptorSet()
+    with io.open(desc_out_path, 'rb') as f:
+        desc_set.ParseFromString(f.read())
+    include_paths = _include_paths(params)
+    manifest = {}
+    for file_descriptor_proto in desc_set.file:
+        path = _resolve_proto(file_descriptor_proto.name, include_paths)
+        manifest[file_descriptor_proto.name] = (
+            cache_utils.file_digest(path) if path else None)
+    cache_utils.store_file(desc_out_path, cache_utils.entry_path(
+        cache_dir, 'descriptors', key, '.desc'))
+    cache_utils.store_json(manifest, cache_utils.entry_path(
+        cache_dir, 'descriptors', key, '.json'))
+    _remove_superseded_descriptor_sets(cache_dir, key)
+
+
+def _remove_superseded_descriptor_sets(cache_dir, key):
+    """Remove the cached descriptor sets of the slot of `key`, other than
+    the one of `key`."""
+    entry_dir = os.path.dirname(
+        cache_utils.entry_path(cache_dir, 'descriptors', key))
+    slot = key.split('.')[0]
+    for name in os.listdir(entry_dir):
+        if name.startswith(slot + '.') and not name.startswith(key + '.'):
+            logger.debug('Removing superseded descriptor set %s' % name)
+            try:
+                os.remove(os.path.join(entry_dir, name))
+            except OSError:
+                pass
+
+
+def _compiler_identity(params):
+    """Identify the protoc binary (or Python module) a command line runs."""
+    identity = []
+    executable = shutil.which(params[0]) or params[0]
+    paths = [executable]
+    if len(params) > 2 and params[1] == '-m':
+        try:
+            spec = importlib.util.find_spec(params[2])
+        except ImportError:
+            spec = None
+        if spec and spec.origin:
+            paths.append(spec.origin)
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(os.path.realpath(path))
+            identity.append([path, stat.st_size, stat.st_mtime])
+        else:
+            identity.append([path])
+    return identity
+
+
+def _include_paths(params):
+    """Return the include paths of a protoc command line, in order.
+
+    Returns:
+        list: (virtual path, disk path) pairs. The virtual path is empty for
+            plain include directories.
+    """
+    includes = []
+    for param in params:
+        if param.startswith('--proto_path='):
+            value = param[len('--proto_path='):]
+        elif param.startswith('-I'):
+            value = param[2:]
+        else:
+            continue
+        if '=' in value:
+            includes.append(tuple(value.split('=', 1)))
+        else:
+            includes.append(('', value))
+    return includes
+
+
+def _resolve_proto(name, include_paths):
+    """Return the file protoc reads for an imported name, or None."""
+    for virtual, path in include_paths:
+        if not virtual:
+            candidate = os.path.join(path, name)
+        elif name == virtual:
+            candidate = path
+        elif name.startswith(virtual.rstrip('/') + '/'):
+            candidate = os.path.join(path, name[len(virtual.rstrip('/')) + 1:])
+        else:
+            continue
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
 def find_google_dir_index(src_proto_path):
     matches = list(re.finditer('(?:\\A|[/\\\\])(google|grafeas)(?=\\Z|[/\\\\])',
                                src_proto_path))
@@ -352,29 +499,97 @@ def prepare_pkg_dir(output_dir, api_name, api_version, organization_name,
     proto_params = PROTO_PARAMS_MAP[language]
     pkg_dir = pkg_root_dir(
         output_dir, api_name, api_version, organization_name, language, prefix)
-    subprocess.check_output([
-        'mkdir', '-p', proto_params.code_root(pkg_dir)],
-        stderr=subprocess.STDOUT)
+    file_utils.makedirs(proto_params.code_root(pkg_dir))
     return pkg_dir
 
 
 def find_protos(proto_paths, excluded_proto_path):
     """Searches along `proto_paths` for .proto files and returns a generator of
-    paths"""
+    paths.
+
+    A file or directory is excluded when it is, or is under, a path in
+    `excluded_proto_path`; excluded directories are not walked at all.
+    Directories in `proto_paths` are walked concurrently, and the files are
+    returned in the order of `proto_paths`.
+    """
     if not isinstance(proto_paths, (types.GeneratorType, collections.abc.MutableSequence)):
         raise ValueError("proto_paths must be a list")
+    proto_paths = list(proto_paths)
+    excluded = _PathTrie(excluded_proto_path)
+    dirs = [path for path in proto_paths if os.path.isdir(path)]
+    if len(dirs) > 1:
+        with futures.ThreadPoolExecutor(
+                min(len(dirs), _MAX_WALK_WORKERS)) as executor:
+            walks = dict(zip(dirs, executor.map(
+                lambda path: _find_protos_in_dir(path, excluded), dirs)))
+    else:
+        walks = {}
     for path in proto_paths:
         if os.path.isdir(path):
-            for root, _, files in os.walk(path):
-                for proto in files:
-                    is_excluded = _is_proto_excluded(os.path.join(root, proto),
-                                                     excluded_proto_path)
-                    if os.path.splitext(proto)[1] == '.proto' and not is_excluded:
-                        yield os.path.join(root, proto)
+            if path not in walks:
+                walks[path] = _find_protos_in_dir(path, excluded)
+            for proto in walks[path]:
+                yield proto
         elif os.path.isfile(path) and os.path.splitext(path)[1] == '.proto':
             yield path
 
 
+_MAX_WALK_WORKERS = 8
+
+
+def _find_protos_in_dir(path, excluded):
+    """Return the .proto files under `path`, in the order of `os.walk`."""
+    protos = []
+    stack = [path]
+    while stack:
+        dir_path = stack.pop()
+        subdirs = []
+        try:
+            # The scandir iterator is only a context manager since Python
+            # 3.6; it is closed once exhausted.
+            for entry in os.scandir(dir_path):
+                if entry.is_dir():
+                    # Like os.walk, do not follow symlinked directories.
+                    if not entry.is_symlink() and entry.path not in excluded:
+                        subdirs.append(entry.path)
+                elif (os.path.splitext(entry.name)[1] == '.proto' and
+                      entry.path not in excluded):
+                    protos.append(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+    return protos
+
+
+class _PathTrie(object):
+    """A trie of path components, containing every path under the paths
+    it is built from."""
+
+    def __init__(self, paths):
+        self._cwd = os.getcwd()
+        self._root = {}
+        for path in paths:
+            node = self._root
+            for part in self._split(path):
+                node = node.setdefault(part, {})
+            node[None] = True
+
+    def _split(self, path):
+        return os.path.normpath(os.path.join(self._cwd, path)).split(os.sep)
+
+    def __contains__(self, path):
+        node = self._root
+        if not node:
+            return False
+        for part in self._split(path):
+            if None in node:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+        return None in node
+
+
 def list_files_recursive(path):
     for root, _, files in os.walk(path):
         for f in files:
@@ -390,12 +605,6 @@ def php_proto_rename(contents):
     return contents
 
 
-def _is_proto_excluded(proto, excluded_proto_path):
-    for excluded_path in excluded_proto_path:
-        if excluded_path in proto:
-            return True
-    return False
-
 _protobuf_path = None
 def _find_protobuf_path(toolkit_path):
     """Fetch and locate protobuf source"""
@@ -19,6 +19,8 @@ import subprocess
 
 import six
 
+from artman.utils import generator_daemon
+
 
 def get_java_tool_path(toolkit_path, tool_name):
     path = os.path.join(toolkit_path, 'build', 'toolpaths', tool_name)
@@ -32,7 +34,12 @@ def gapic_gen_task(toolkit_path, task_args):
     gapic_jar = os.path.join(toolkit_path, 'build/libs/gapic-generator-latest-fatjar.jar')
     if not os.path.exists(gapic_jar):
         run_gradle_task(toolkit_path, 'fatJar')
-    return ['java', '-cp', gapic_jar, 'com.google.api.codegen.GeneratorMain'] + task_args
+    main_class = 'com.google.api.codegen.GeneratorMain'
+    daemon_command = generator_daemon.command(
+        gapic_jar, main_class, list(task_args))
+    if daemon_command:
+        return daemon_command
+    return ['java', '-cp', gapic_jar, main_class] + task_args
 
 
 def run_gradle_task(toolkit_path, task_name, task_args=()):
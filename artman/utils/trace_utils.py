@@ -0,0 +1,94 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timing traces in the Chrome trace event format.
+
+Once enabled, spans for config loading, pipeline construction, tasks and
+external commands are recorded, and `write` saves them as a JSON trace that
+can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+Recording is a no-op while tracing is disabled.
+"""
+
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+
+_events = None
+_thread_names = {}
+_lock = threading.Lock()
+
+
+def enable():
+    """Start recording spans."""
+    global _events
+    _events = []
+
+
+def now():
+    """Return the current trace timestamp, in seconds."""
+    return time.perf_counter()
+
+
+def record(name, category, start, end, args=None):
+    """Record a span that ran on the current thread.
+
+    Args:
+        name (str): The span name shown in the trace.
+        category (str): The span category, e.g. `task` or `command`.
+        start (float): The start timestamp, as returned by `now`.
+        end (float): The end timestamp, as returned by `now`.
+        args (dict): Optional details shown for the span.
+    """
+    if _events is None:
+        return
+    thread = threading.current_thread()
+    event = {
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': start * 1e6,
+        'dur': (end - start) * 1e6,
+        'pid': os.getpid(),
+        'tid': thread.ident,
+    }
+    if args:
+        event['args'] = args
+    with _lock:
+        _events.append(event)
+        _thread_names[thread.ident] = thread.name
+
+
+@contextlib.contextmanager
+def span(name, category, args=None):
+    """Record the enclosed block as a span."""
+    start = now()
+    try:
+        yield
+    finally:
+        record(name, category, start, now(), args)
+
+
+def write(path):
+    """Write the recorded spans to a Chrome trace JSON file."""
+    with _lock:
+        events = list(_events or [])
+        for tid, thread_name in sorted(_thread_names.items()):
+            events.append({'name': 'thread_name', 'ph': 'M',
+                           'pid': os.getpid(), 'tid': tid,
+                           'args': {'name': thread_name}})
+    with io.open(path, 'w', encoding='UTF-8') as f:
+        f.write(json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}))
@@ -0,0 +1,273 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Microbenchmarks for the Python hot paths of artman.
+
+The benchmarks run against a synthetic proto tree generated in a temporary
+directory, whose size is configurable:
+
+    python benchmark/run_benchmarks.py --files 5000 --depth 6 \\
+        --exclusions 100 --json-out benchmark.json
+
+Each benchmark runs for a number of rounds, and the timings (in seconds) are
+printed and, with `--json-out`, written as JSON so that runs can be compared
+to catch regressions. `-k` selects the benchmarks whose name contains the
+given string. pandoc is stubbed out, so only artman's own work is measured.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import mock
+
+from artman.config import converter
+from artman.config import loader
+from artman.tasks import descriptor_set_tasks
+from artman.tasks import python_grpc_tasks
+from artman.utils import config_util
+from artman.utils import proto_index
+from artman.utils import protoc_utils
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+ARTMAN_CONFIG = os.path.join(
+    CUR_DIR, os.pardir, 'test', 'cli', 'data', 'artman_test.yaml')
+
+COMMON_PROTOS = ['google/api/annotations.proto', 'google/rpc/status.proto',
+                 'google/protobuf/empty.proto']
+
+
+def make_proto_tree(root, files, depth, exclusions, seed=0):
+    """Write a synthetic googleapis-like proto tree.
+
+    The files are spread over APIs nested `depth` directories deep, each
+    importing a few files of its own API, of another API and the common
+    protos.
+
+    Returns:
+        tuple: The list of proto files, and `exclusions` directories of the
+            tree to exclude.
+    """
+    rand = random.Random(seed)
+    apis = max(1, files // 20)
+    api_dirs = []
+    for i in range(apis):
+        parts = ['google', 'cloud'] + [
+            'area%d' % ((i >> level) % 4) for level in range(depth - 4)]
+        api_dirs.append(os.path.join(*(parts + ['api%d' % i, 'v1'])))
+    protos = []
+    for i in range(files):
+        api_dir = api_dirs[i % apis]
+        protos.append(os.path.join(api_dir, 'file%d.proto' % i))
+    for proto in protos:
+        api_dir = os.path.dirname(proto)
+        package = api_dir.replace(os.path.sep, '.')
+        imports = [rand.choice(protos) for _ in range(3)] + COMMON_PROTOS
+        path = os.path.join(root, proto)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='UTF-8') as f:
+            f.write(u'syntax = "proto3";\n\npackage %s;\n\n' % package)
+            for import_ in imports:
+                f.write(u'import "%s";\n' % import_.replace(os.path.sep, '/'))
+            f.write(u'\noption go_package = "google.golang.org/genproto/'
+                    u'googleapis/%s;%s";\n' % (api_dir, 'api'))
+            f.write(u'option java_package = "com.%s";\n\n' % package)
+            f.write(u'// A message.\nmessage M {\n  string name = 1;\n}\n')
+    for proto in COMMON_PROTOS:
+        path = os.path.join(root, proto)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='UTF-8') as f:
+            f.write(u'syntax = "proto3";\n\npackage %s;\n' % os.path.dirname(
+                proto).replace('/', '.'))
+    excluded = [os.path.join(root, os.path.dirname(protos[i]))
+                for i in rand.sample(range(len(protos)),
+                                     min(exclusions, len(protos)))]
+    return [os.path.join(root, proto) for proto in protos], excluded
+
+
+def make_comments(count, seed=0):
+    """Return proto comments with a mix of plain and Markdown text."""
+    rand = random.Random(seed)
+    samples = [
+        'Gets a resource.',
+        'The `name` of the [Resource][google.cloud.api.v1.Resource].',
+        'Lists the resources.\n\n* first item\n* second item',
+        'See [the guide](/docs/guide) for **details**.',
+        'Required. The parent, in the form `projects/*/locations/*`.',
+    ]
+    return ['%s %d' % (rand.choice(samples), i) for i in range(count)]
+
+
+def make_config(width, depth):
+    """Return a nested dict like the legacy artman config."""
+    if depth == 0:
+        return {'key%d' % i: ['value%d' % i] for i in range(width)}
+    return {'key%d' % i: make_config(width, depth - 1) for i in range(width)}
+
+
+class Suite(object):
+    """The benchmarks, sharing one synthetic proto tree."""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmp_dir = tempfile.mkdtemp(prefix='artman-benchmark-')
+        self.root = os.path.join(self.tmp_dir, 'googleapis')
+        self.protos, self.excluded = make_proto_tree(
+            self.root, args.files, args.depth, args.exclusions)
+        self.task = python_grpc_tasks.PythonChangePackageTask('benchmark')
+        self.task._organization_name = 'google-cloud'
+        self.comments = make_comments(args.comments)
+        self.configs = [make_config(8, 3) for _ in range(4)]
+
+    def close(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def benchmarks(self):
+        """Return (name, setup, function) triples. `setup` runs before each
+        round, untimed, and returns the arguments of `function`."""
+        return [
+            ('find_protos', lambda: (),
+             lambda: list(protoc_utils.find_protos(
+                 [os.path.join(self.root, 'google')], self.excluded))),
+            ('group_by_go_package/cold', _reset_proto_index,
+             lambda: protoc_utils.group_by_go_package(self.protos)),
+            ('group_by_go_package/warm', lambda: (),
+             lambda: protoc_utils.group_by_go_package(self.protos)),
+            ('python_import_closure', _reset_proto_index,
+             lambda: self.task._import_closure(
+                 self.protos[:10], [self.root])),
+            ('python_copy_and_transform', self._new_dest,
+             lambda dest: self.task._copy_and_transform_protos(
+                 self.protos, dest, ['google.api', 'google.rpc',
+                                     'google.protobuf'])),
+            ('md2rst_all', lambda: (), self._md2rst_all),
+            ('load_artifact_config', lambda: (),
+             lambda: loader.load_artifact_config(
+                 ARTMAN_CONFIG, 'python_gapic')),
+            ('load_all_artifact_configs', lambda: (),
+             lambda: loader.load_all_artifact_configs(ARTMAN_CONFIG)),
+            ('convert_to_legacy_config_dict', self._artifact_config,
+             lambda config: converter.convert_to_legacy_config_dict(
+                 config, os.path.dirname(ARTMAN_CONFIG), self.tmp_dir)),
+            ('config_util_merge', lambda: (),
+             lambda: config_util.merge(*self.configs)),
+        ]
+
+    def _new_dest(self):
+        dest = os.path.join(self.tmp_dir, 'python')
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
+        return (dest,)
+
+    def _artifact_config(self):
+        return (loader.load_artifact_config(ARTMAN_CONFIG, 'python_gapic'),)
+
+    def _md2rst_all(self):
+        with mock.patch.object(descriptor_set_tasks, '_convert',
+                               side_effect=lambda text: text):
+            descriptor_set_tasks.md2rst_all(self.comments)
+
+
+def _reset_proto_index():
+    proto_index._entries = None
+    return ()
+
+
+def run(name, setup, function, rounds):
+    """Time `rounds` calls of `function`, and summarize them."""
+    timings = []
+    for _ in range(rounds):
+        args = setup() or ()
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return {
+        'name': name,
+        'rounds': rounds,
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.mean(timings),
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if rounds > 1 else 0.0,
+        'timings': timings,
+    }
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--files', type=int, default=2000,
+                        help='Number of protos in the synthetic tree.')
+    parser.add_argument('--depth', type=int, default=6,
+                        help='Directory depth of the API packages.')
+    parser.add_argument('--exclusions', type=int, default=50,
+                        help='Number of excluded directories.')
+    parser.add_argument('--comments', type=int, default=5000,
+                        help='Number of comments converted by md2rst.')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='Number of timed rounds per benchmark.')
+    parser.add_argument('-k', dest='keyword', default='',
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--json-out', default=None,
+                        help='File to which the results are written as JSON.')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(sys.argv[1:] if args is None else args)
+    suite = Suite(args)
+    results = []
+    try:
+        for name, setup, function in suite.benchmarks():
+            if args.keyword not in name:
+                continue
+            result = run(name, setup, function, args.rounds)
+            print('{name:<32} min {min:.4f}s  median {median:.4f}s  '
+                  'max {max:.4f}s'.format(**result))
+            results.append(result)
+    finally:
+        suite.close()
+    if args.json_out:
+        with io.open(args.json_out, 'w', encoding='UTF-8') as f:
+            f.write(json.dumps({
+                'machine': {
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpus': os.cpu_count(),
+                },
+                'params': {
+                    'files': args.files,
+                    'depth': args.depth,
+                    'exclusions': args.exclusions,
+                    'comments': args.comments,
+                },
+                'benchmarks': results,
+            }, indent=2, sort_keys=True))
+    return results
+
+
+if __name__ == '__main__':
+    main()
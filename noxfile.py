@@ -31,6 +31,15 @@ def unit_tests(session):
     session.run('py.test', '-rxs', '--cov', '--cov-append', '--cov-report=')
 
 
+@nox.session(python='3.6')
+def benchmarks(session):
+    """Run the microbenchmarks, writing the results to benchmark.json."""
+    session.install('mock')
+    session.install('-e', '.')
+    session.run('python', 'benchmark/run_benchmarks.py',
+                '--json-out', 'benchmark.json', *session.posargs)
+
+
 @nox.session(python='3.6')
 def lint(session):
     """Run the linter."""
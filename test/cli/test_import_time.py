@@ -0,0 +1,70 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import pytest
+
+# Modules which are only needed once a pipeline runs, and must not be loaded
+# by importing the CLI.
+HEAVY_MODULES = (
+    'artman.config.loader',
+    'artman.pipelines',
+    'gcloud',
+    'pkg_resources',
+    'protobuf_to_dict',
+    'pypandoc',
+    'taskflow',
+    'yaml',
+)
+
+# The budget, in seconds, for importing the CLI in a fresh interpreter, e.g.
+# `ARTMAN_IMPORT_BUDGET=0.4`. Wall-clock timings are unreliable on shared CI
+# runners, so the timing check only runs when a budget is set.
+IMPORT_BUDGET = os.environ.get('ARTMAN_IMPORT_BUDGET')
+
+_SCRIPT = '''
+import json, sys, time
+start = time.time()
+import artman.cli.main
+elapsed = time.time() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'modules': [m for m in %r if m in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+
+def _import_cli():
+    output = subprocess.check_output([sys.executable, '-c', _SCRIPT])
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+class ImportTimeTests(unittest.TestCase):
+
+    def test_heavy_modules_not_imported(self):
+        assert _import_cli()['modules'] == []
+
+    @pytest.mark.skipif(not IMPORT_BUDGET,
+                        reason='ARTMAN_IMPORT_BUDGET is not set')
+    def test_import_budget(self):
+        # The best of a few runs, to leave out a cold disk cache.
+        elapsed = min(_import_cli()['elapsed'] for _ in range(3))
+        assert elapsed < float(IMPORT_BUDGET), (
+            'Importing artman.cli.main took %.3fs' % elapsed)
@@ -16,15 +16,20 @@ from __future__ import absolute_import
 from argparse import Namespace
 import io
 import os
+import shutil
+import tempfile
 import textwrap
 import unittest
 
 import mock
 
 import pytest
+from taskflow.patterns import linear_flow
 
 from artman.cli import main
+from artman.config import loader
 from artman.config.proto.user_config_pb2 import UserConfig, LocalConfig, GitHubConfig
+from artman.tasks import task_base
 from artman.utils.logger import logger
 
 
@@ -47,6 +52,16 @@ class ParseArgsTests(unittest.TestCase):
         assert flags.artifact_name == 'python_gapic'
         assert flags.aspect is None
         assert flags.image == main.ARTMAN_DOCKER_IMAGE
+        assert flags.engine == 'serial'
+        assert flags.jobs is None
+        assert flags.trace_out is None
+        assert flags.scratch_dir is None
+
+    def test_parallel_engine_args(self):
+        flags = main.parse_args('--engine', 'parallel', '--jobs', '4',
+                                'generate', 'java_gapic')
+        assert flags.engine == 'parallel'
+        assert flags.jobs == 4
 
 class NormalizeFlagTests(unittest.TestCase):
     def setUp(self):
@@ -75,3 +90,313 @@ class NormalizeFlagTests(unittest.TestCase):
         assert args['toolkit_path']
         assert args['language'] == 'python'
         assert args['generator_args'] == ['--dev_samples --other']
+
+    def test_common_proto_root(self):
+        self.flags.common_proto_root = '/tmp/artman-common-protos'
+        _, args = main.normalize_flags(self.flags, self.user_config)
+        assert args['import_proto_path'] == [
+            os.path.join(CUR_DIR, 'data'), '/tmp/artman-common-protos']
+
+
+class GenerateAllTests(unittest.TestCase):
+    def setUp(self):
+        self.flags = main.parse_args(
+            '--local', '--root-dir', os.path.join(CUR_DIR, 'data'),
+            'generate-all', 'artman_test.yaml',
+            '--artifacts', 'java_gapic,python_gapic,gapic_config')
+        self.user_config = UserConfig()
+
+    def test_parse_args(self):
+        flags = main.parse_args('generate-all')
+        assert flags.subcommand == 'generate-all'
+        assert flags.configs == []
+        assert flags.artifacts is None
+        assert flags.workers is None
+
+    @mock.patch.object(main, '_change_owner')
+    @mock.patch.object(main, '_run_pipeline')
+    def test_generate_all(self, run_pipeline, change_owner):
+        main._generate_all(self.flags, self.user_config)
+        names = [c[0][0].artifact_name for c in run_pipeline.call_args_list]
+        # All artifacts share one API, so they run in order, and the GAPIC
+        # config comes last.
+        assert names == ['java_gapic', 'python_gapic', 'gapic_config']
+        assert run_pipeline.call_args_list[0][0][1] == 'GapicClientPipeline'
+        assert change_owner.call_count == 3
+
+    @mock.patch.object(main, '_change_owner')
+    @mock.patch.object(main, '_run_pipeline')
+    @mock.patch('artman.config.loader.load_artifact_config')
+    def test_generate_all_loads_config_once(self, load_artifact_config,
+                                            run_pipeline, change_owner):
+        with mock.patch.object(loader, '_parse',
+                               wraps=loader._parse) as parse:
+            main._generate_all(self.flags, self.user_config)
+        assert run_pipeline.call_count == 3
+        load_artifact_config.assert_not_called()
+        assert parse.call_count == 1
+
+    @mock.patch.object(main, '_change_owner')
+    @mock.patch.object(main, '_run_pipeline')
+    def test_generate_all_failure(self, run_pipeline, change_owner):
+        run_pipeline.side_effect = [None, RuntimeError('boom'), None]
+        with pytest.raises(SystemExit) as excinfo:
+            main._generate_all(self.flags, self.user_config)
+        assert excinfo.value.code == 32
+        assert run_pipeline.call_count == 3
+
+    @mock.patch.object(main, '_change_owner')
+    @mock.patch.object(main, '_run_pipeline')
+    def test_generate_all_malformed_config(self, run_pipeline, change_owner):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        bad_config = os.path.join(tmp_dir, 'artman_bad.yaml')
+        with io.open(bad_config, 'w') as f:
+            f.write(u'common: [unclosed\n')
+        self.flags.configs = ['artman_test.yaml', bad_config]
+        with mock.patch.object(main.logger, 'error') as error:
+            with pytest.raises(SystemExit) as excinfo:
+                main._generate_all(self.flags, self.user_config)
+        assert excinfo.value.code == 32
+        # The valid config still ran, and the malformed one is reported.
+        assert run_pipeline.call_count == 3
+        assert any(c[0][0].startswith('FAILURE ')
+                   and 'artman_bad.yaml' in c[0][0]
+                   for c in error.call_args_list)
+
+    def test_find_artman_configs(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        for path in ('artman_a.yaml', 'b/artman_b.yaml', 'b/other.yaml',
+                     '.git/artman_hidden.yaml'):
+            path = os.path.join(tmp_dir, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            io.open(path, 'w').close()
+        assert main._find_artman_configs(tmp_dir) == [
+            os.path.join(tmp_dir, 'artman_a.yaml'),
+            os.path.join(tmp_dir, 'b', 'artman_b.yaml')]
+
+    @mock.patch.object(main, '_change_owner')
+    @mock.patch.object(main, '_run_pipeline')
+    def test_generate_several_artifacts(self, run_pipeline, change_owner):
+        main.main('--local', '--root-dir', os.path.join(CUR_DIR, 'data'),
+                  '--config', 'artman_test.yaml', '--cache-dir', '',
+                  'generate', 'python_gapic,java_gapic')
+        names = [c[0][0].artifact_name for c in run_pipeline.call_args_list]
+        assert names == ['java_gapic', 'python_gapic']
+        # Without a cache, the artifacts still share one for the run.
+        cache_dirs = set(c[0][2]['cache_dir']
+                         for c in run_pipeline.call_args_list)
+        assert len(cache_dirs) == 1
+        cache_dir, = cache_dirs
+        assert cache_dir and not os.path.exists(cache_dir)
+
+    @mock.patch.object(main, '_run_pipeline')
+    def test_generate_unknown_artifact(self, run_pipeline):
+        with pytest.raises(SystemExit) as excinfo:
+            main.main('--local', '--root-dir', os.path.join(CUR_DIR, 'data'),
+                      '--config', 'artman_test.yaml', '--cache-dir', '',
+                      'generate', 'python_gapic,cobol_gapic')
+        assert excinfo.value.code == 96
+        run_pipeline.assert_not_called()
+
+
+class WarmContainerTests(unittest.TestCase):
+    CONTAINER_ARGS = ['-w', '/googleapis']
+
+    @mock.patch('subprocess.call')
+    @mock.patch('subprocess.check_output')
+    @mock.patch('subprocess.run')
+    def test_start_and_exec(self, run, check_output, call):
+        run.return_value = mock.Mock(returncode=1, stdout=b'')
+        call.return_value = 0
+        output_dir = main._run_artman_in_warm_container(
+            'image', self.CONTAINER_ARGS, 'generate java_gapic', '/out')
+        assert output_dir == '/out'
+        start_cmd = check_output.call_args[0][0]
+        name = start_cmd[start_cmd.index('--name') + 1]
+        assert name.startswith('artman-warm-')
+        assert start_cmd[:3] == ['docker', 'run', '-d']
+        assert start_cmd[-4:] == ['image', '/bin/bash', '-c', 'sleep infinity']
+        exec_cmd = call.call_args[0][0]
+        assert exec_cmd[:2] == ['docker', 'exec']
+        assert exec_cmd[-4:] == [name, '/bin/bash', '-c',
+                                 'artman --local generate java_gapic']
+
+    @mock.patch('subprocess.call')
+    @mock.patch('subprocess.check_output')
+    @mock.patch('subprocess.run')
+    def test_reuse_running_container(self, run, check_output, call):
+        run.return_value = mock.Mock(returncode=0, stdout=b'true\n')
+        call.return_value = 0
+        main._run_artman_in_warm_container(
+            'image', self.CONTAINER_ARGS, 'generate java_gapic', '/out')
+        check_output.assert_not_called()
+        assert call.call_count == 1
+
+    @mock.patch('subprocess.call')
+    @mock.patch('subprocess.check_output')
+    @mock.patch('subprocess.run')
+    def test_exec_failure(self, run, check_output, call):
+        run.return_value = mock.Mock(returncode=0, stdout=b'true\n')
+        call.return_value = 1
+        with pytest.raises(SystemExit) as excinfo:
+            main._run_artman_in_warm_container(
+                'image', self.CONTAINER_ARGS, 'generate java_gapic', '/out')
+        assert excinfo.value.code == 32
+
+    @mock.patch('subprocess.check_output')
+    def test_docker_stop(self, check_output):
+        check_output.side_effect = [b'abc\ndef\n', b'']
+        main.main('docker', 'stop')
+        assert check_output.call_args_list[1][0][0] == [
+            'docker', 'rm', '-f', 'abc', 'def']
+
+
+class CommonProtoRootTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.googleapis = os.path.join(self.tmp_dir, 'googleapis')
+        for src_dir in ('google/api', 'google/rpc'):
+            os.makedirs(os.path.join(self.googleapis, src_dir))
+            with io.open(os.path.join(self.googleapis, src_dir, 'a.proto'),
+                         'w', encoding='UTF-8') as f:
+                f.write(u'syntax = "proto3";\n')
+        self.root_dir = os.path.join(self.tmp_dir, 'root')
+        os.makedirs(os.path.join(self.root_dir, 'google/rpc'))
+        patchers = [
+            mock.patch.object(main, 'VERSIONED_GOOGLEAPIS_DIR', self.googleapis),
+            mock.patch.dict(os.environ,
+                            {main.RUNNING_IN_ARTMAN_DOCKER_TOKEN: 'True'}),
+            mock.patch('tempfile.gettempdir', return_value=self.tmp_dir),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_links_missing_dirs(self):
+        common_root = main._common_proto_root(self.root_dir)
+        proto = os.path.join(common_root, 'google/api/a.proto')
+        assert os.path.islink(proto)
+        assert os.path.realpath(proto) == os.path.realpath(
+            os.path.join(self.googleapis, 'google/api/a.proto'))
+        # Directories the user provides are not linked, and nothing is
+        # written to the input directory.
+        assert not os.path.exists(os.path.join(common_root, 'google/rpc'))
+        assert os.listdir(os.path.join(self.root_dir, 'google')) == ['rpc']
+        assert main._common_proto_root(self.root_dir) == common_root
+
+    def test_outside_docker(self):
+        with mock.patch.dict(os.environ):
+            del os.environ[main.RUNNING_IN_ARTMAN_DOCKER_TOKEN]
+            assert main._common_proto_root(self.root_dir) is None
+
+
+class ChangeOwnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        for path in ('old/api/a.py', 'python/new_api/b.py', 'new.desc'):
+            path = os.path.join(self.output_dir, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            io.open(path, 'w').close()
+        self.flags = Namespace(output_dir=self.output_dir)
+        self.pipeline_kwargs = {'gapic_yaml': ''}
+        patcher = mock.patch.dict(
+            os.environ, {'HOST_USER_ID': '4242', 'HOST_GROUP_ID': '4242'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _changed(self, snapshot=None):
+        with mock.patch('os.chown') as chown:
+            main._change_owner(
+                self.flags, 'GapicClientPipeline', self.pipeline_kwargs,
+                snapshot)
+        return set(os.path.relpath(c[0][0], self.output_dir)
+                   for c in chown.call_args_list)
+
+    def test_whole_output_dir(self):
+        changed = self._changed()
+        assert changed == {'.', 'old', 'old/api', 'old/api/a.py', 'python',
+                           'python/new_api', 'python/new_api/b.py',
+                           'new.desc'}
+
+    def test_only_changed_directories(self):
+        for root, _, _ in os.walk(self.output_dir):
+            os.utime(root, (0, 0))
+        snapshot = main._snapshot_owned_directories(
+            self.flags, self.pipeline_kwargs)
+        # The run adds a file to an existing directory, and a new directory.
+        io.open(os.path.join(self.output_dir, 'old', 'api', 'c.py'),
+                'w').close()
+        os.makedirs(os.path.join(self.output_dir, 'old', 'other'))
+        io.open(os.path.join(self.output_dir, 'old', 'other', 'd.py'),
+                'w').close()
+        changed = self._changed(snapshot)
+        assert changed == {'old', 'old/api', 'old/api/a.py', 'old/api/c.py',
+                           'old/other', 'old/other/d.py'}
+
+    def test_no_snapshot_outside_docker(self):
+        with mock.patch.dict(os.environ, {'HOST_USER_ID': '0'}):
+            assert main._snapshot_owned_directories(
+                self.flags, self.pipeline_kwargs) is None
+
+    def test_skips_owned_paths(self):
+        owned = os.path.join(self.output_dir, 'old', 'api', 'a.py')
+        real_stat = os.stat
+
+        def stat(path):
+            result = real_stat(path)
+            if path == owned:
+                return mock.Mock(st_uid=4242, st_gid=4242)
+            return result
+
+        with mock.patch('os.stat', side_effect=stat):
+            changed = self._changed()
+        assert 'old/api/a.py' not in changed
+        assert 'python/new_api/b.py' in changed
+
+
+class _IntermediateTask(task_base.TaskBase):
+    default_provides = 'intermediate'
+
+    def execute(self, scratch_dir, fail=False):
+        path = os.path.join(scratch_dir, 'api.desc')
+        io.open(path, 'w').close()
+        if fail:
+            raise RuntimeError('boom')
+        return path
+
+
+class ScratchDirTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_root)
+        self.flags = Namespace(engine='serial', jobs=None,
+                               scratch_dir=self.scratch_root)
+        patcher = mock.patch(
+            'artman.pipelines.pipeline_factory.make_pipeline',
+            side_effect=lambda name, **kwargs: Namespace(
+                flow=linear_flow.Flow(name).add(_IntermediateTask('task')),
+                kwargs=kwargs))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_removed_on_success(self):
+        results = main._run_pipeline(self.flags, 'Pipeline', {})
+        assert os.path.dirname(os.path.dirname(
+            results['intermediate'])) == self.scratch_root
+        assert os.listdir(self.scratch_root) == []
+
+    def test_kept_on_failure(self):
+        with pytest.raises(Exception):
+            main._run_pipeline(self.flags, 'Pipeline', {'fail': True})
+        run_dir, = os.listdir(self.scratch_root)
+        assert os.listdir(os.path.join(self.scratch_root, run_dir)) == [
+            'api.desc']
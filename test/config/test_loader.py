@@ -46,6 +46,33 @@ class ArtmanYamlParserTest(unittest.TestCase):
         assert expected == str(excinfo.value)
 
 
+class ListArtifactNamesTest(unittest.TestCase):
+    def test_gapic_config_last(self):
+        artman_yaml = os.path.join(
+            CUR_DIR, '..', 'cli', 'data', 'artman_test.yaml')
+        names = loader.list_artifact_names(artman_yaml)
+        assert names[0] == 'java_gapic'
+        assert names[-1] == 'gapic_config'
+        assert len(names) == 8
+
+
+class LoadAllArtifactConfigsTest(unittest.TestCase):
+    def test_matches_load_artifact_config(self):
+        artman_yaml = os.path.join(
+            CUR_DIR, '..', 'cli', 'data', 'artman_test.yaml')
+        configs = loader.load_all_artifact_configs(artman_yaml)
+        assert list(configs) == loader.list_artifact_names(artman_yaml)
+        for name, config in configs.items():
+            assert config == loader.load_artifact_config(artman_yaml, name)
+
+    def test_parses_once(self):
+        artman_yaml = os.path.join(
+            CUR_DIR, '..', 'cli', 'data', 'artman_test.yaml')
+        with mock.patch.object(loader, '_parse', wraps=loader._parse) as parse:
+            loader.load_all_artifact_configs(artman_yaml, aspect='CODE')
+        parse.assert_called_once_with(artman_yaml)
+
+
 class ReadUserConfigTests(unittest.TestCase):
     @mock.patch.object(logger, 'warn')
     def test_no_config(self, warn):
@@ -20,12 +20,14 @@ import mock
 
 import pytest
 
+from taskflow.patterns import graph_flow
 from taskflow.patterns import linear_flow
 
 from artman.pipelines import code_generation
 from artman.pipelines import gapic_generation
 from artman.pipelines import pipeline_base
 from artman.tasks import io_tasks
+from artman.tasks import task_base
 
 
 class CodeGenerationPipelineBaseTests(unittest.TestCase):
@@ -79,6 +81,68 @@ class CodeGenerationPipelineBaseTests(unittest.TestCase):
         assert isinstance(flow, linear_flow.Flow)
         assert len(flow) == 7
 
+    def test_do_build_flow_parallel(self):
+        CGPB = code_generation.CodeGenerationPipelineBase
+        with mock.patch.object(CGPB, 'validate_kwargs') as validate:
+            cgpb = CGPB(
+                gapic_generation.GapicTaskFactory(),
+                language='java', aspect='ALL'
+            )
+            validate.assert_called_once()
+        flow = cgpb.do_build_flow(language='java', gapic_code_dir='output',
+                                  aspect='ALL', engine='parallel')
+        assert isinstance(flow, linear_flow.Flow)
+        prepare, graph = list(flow)
+        assert isinstance(prepare, io_tasks.PrepareGoogleapisDirTask)
+        assert isinstance(graph, graph_flow.Flow)
+
+        by_class = {type(t).__name__: t for t, _ in graph.iter_nodes()}
+        def depends_on(name, dep_name):
+            return any(
+                u is by_class[dep_name] and v is by_class[name]
+                for u, v, _ in graph.iter_links())
+        # Linked through `descriptor_set` and `gapic_code_dir`.
+        assert depends_on('GapicCodeGenTask', 'ProtoDescGenTask')
+        assert depends_on('JavaFormatTask', 'GapicCodeGenTask')
+        # Both provide `proto_code_dir`, so they must stay ordered.
+        assert depends_on('ResourceNameGenTask', 'ProtoCodeGenTask')
+        # The GAPIC and gRPC halves are independent.
+        assert not depends_on('GrpcCodeGenTask', 'GapicCodeGenTask')
+        assert not depends_on('ProtoCodeGenTask', 'GapicCodeGenTask')
+
+    def _parallel_graph_links(self, language):
+        CGPB = code_generation.CodeGenerationPipelineBase
+        with mock.patch.object(CGPB, 'validate_kwargs'):
+            cgpb = CGPB(
+                gapic_generation.GapicTaskFactory(),
+                language=language, aspect='ALL'
+            )
+        flow = cgpb.do_build_flow(language=language, gapic_code_dir='output',
+                                  aspect='ALL', engine='parallel')
+        _, graph = list(flow)
+        return {(type(u).__name__, type(v).__name__)
+                for u, v, _ in graph.iter_links()}
+
+    def test_do_build_flow_parallel_go_formats_after_copy(self):
+        links = self._parallel_graph_links('go')
+        # Both change `gapic_code_dir` in place.
+        assert ('GoCopyTask', 'GoFormatTask') in links
+
+    def test_do_build_flow_parallel_php_formats_after_move(self):
+        links = self._parallel_graph_links('php')
+        assert ('PhpGrpcMoveTask', 'PhpFormatTask') in links
+
+    def test_do_build_flow_incremental(self):
+        CGPB = code_generation.CodeGenerationPipelineBase
+        with mock.patch.object(CGPB, 'validate_kwargs'):
+            cgpb = CGPB(
+                gapic_generation.GapicTaskFactory(),
+                language='java', aspect='ALL'
+            )
+        flow = cgpb.do_build_flow(language='java', gapic_code_dir='output',
+                                  aspect='ALL', incremental=True)
+        assert isinstance(list(flow)[-1], task_base.RecordIncrementalRunsTask)
+
     @mock.patch.object(code_generation, '_validate_exists')
     @mock.patch.object(code_generation, '_validate_does_not_exist')
     def test_validation(self, does_not_exist, does_exist):
@@ -0,0 +1,101 @@
+# Copyright 2016 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import threading
+import unittest
+
+from taskflow import engines
+
+from artman.pipelines import pipeline_base
+from artman.tasks import task_base
+
+
+_lock = threading.Lock()
+
+
+class _RecordingTask(task_base.TaskBase):
+    def execute(self, events):
+        with _lock:
+            events.append(self.name)
+        return self.name
+
+
+class _ReadingTask(_RecordingTask):
+    def execute(self, events, src):
+        super(_ReadingTask, self).execute(events)
+        return src
+
+
+class MakeGraphFlowTests(unittest.TestCase):
+    def _links(self, flow):
+        return {(u.name, v.name) for u, v, _ in flow.iter_links()}
+
+    def test_links_reader_after_latest_provider(self):
+        first = _RecordingTask('first', provides='src')
+        second = _RecordingTask('second', provides='src')
+        reader = _ReadingTask('reader')
+        flow = pipeline_base.make_graph_flow(
+            'test', [first, second, reader])
+        assert self._links(flow) == {
+            ('first', 'second'), ('second', 'reader')}
+
+    def test_links_provider_after_earlier_readers(self):
+        provider = _RecordingTask('provider', provides='src')
+        reader = _ReadingTask('reader')
+        mover = _RecordingTask('mover', provides='src')
+        flow = pipeline_base.make_graph_flow(
+            'test', [provider, reader, mover])
+        assert ('reader', 'mover') in self._links(flow)
+        assert ('provider', 'mover') in self._links(flow)
+
+    def test_links_mutating_tasks_in_order(self):
+        provider = _RecordingTask('provider', provides='src')
+        copier = _ReadingTask('copier')
+        copier.mutates = ('src',)
+        formatter = _ReadingTask('formatter')
+        formatter.mutates = ('src',)
+        reader = _ReadingTask('reader')
+        flow = pipeline_base.make_graph_flow(
+            'test', [provider, copier, formatter, reader])
+        assert self._links(flow) == {
+            ('provider', 'copier'), ('copier', 'formatter'),
+            ('formatter', 'reader')}
+
+    def test_independent_tasks_are_not_linked(self):
+        a = _RecordingTask('a', provides='x')
+        b = _RecordingTask('b', provides='y')
+        flow = pipeline_base.make_graph_flow('test', [a, b])
+        assert self._links(flow) == set()
+
+    def test_runs_in_parallel_engine(self):
+        events = []
+        flow = pipeline_base.make_graph_flow('test', [
+            _RecordingTask('first', provides='src'),
+            _RecordingTask('other', provides='unused'),
+            _RecordingTask('second', provides='src'),
+            _ReadingTask('reader'),
+        ])
+        engine = engines.load(flow, engine='parallel', max_workers=2,
+                              store={'events': events})
+        engine.run()
+        assert sorted(events) == ['first', 'other', 'reader', 'second']
+        assert events.index('first') < events.index('second')
+        assert events.index('second') < events.index('reader')
+        # The reader sees the value of the latest provider.
+        assert engine.storage.get('reader') == 'second'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+import mock
+import pytest
+
+from artman.pipelines import pipeline_base
+from artman.pipelines import pipeline_factory
+
+
+class PipelineFactoryTests(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(pipeline_factory.PIPELINES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(pipeline_factory._classes, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_registered_pipelines(self):
+        for name in pipeline_factory.PIPELINES:
+            cls = pipeline_factory.pipeline_class(name)
+            assert cls.__name__ == name
+            assert issubclass(cls, pipeline_base.PipelineBase)
+
+    def test_make_pipeline(self):
+        pipeline = pipeline_factory.make_pipeline('EmptyPipeline')
+        assert isinstance(pipeline, pipeline_base.EmptyPipeline)
+
+    def test_register(self):
+        pipeline_factory.register(
+            'MyPipeline', 'artman.pipelines.pipeline_base:EmptyPipeline')
+        pipeline = pipeline_factory.make_pipeline('MyPipeline')
+        assert isinstance(pipeline, pipeline_base.EmptyPipeline)
+
+    def test_class_is_cached(self):
+        with mock.patch('importlib.import_module',
+                        wraps=__import__('importlib').import_module) as imp:
+            pipeline_factory.pipeline_class('EmptyPipeline')
+            pipeline_factory.pipeline_class('EmptyPipeline')
+        assert imp.call_count == 1
+
+    def test_entry_points(self):
+        entry_point = mock.Mock(
+            value='artman.pipelines.pipeline_base:EmptyPipeline')
+        entry_point.name = 'PluginPipeline'
+        entry_points = mock.Mock(spec=['select'])
+        entry_points.select.return_value = [entry_point]
+        with mock.patch.object(pipeline_factory, '_entry_points_loaded',
+                               False), \
+                mock.patch.object(pipeline_factory.metadata, 'entry_points',
+                                  return_value=entry_points):
+            cls = pipeline_factory.pipeline_class('PluginPipeline')
+        entry_points.select.assert_called_once_with(
+            group=pipeline_factory.ENTRY_POINT_GROUP)
+        assert cls is pipeline_base.EmptyPipeline
+
+    def test_entry_points_with_pkg_resources(self):
+        entry_point = mock.Mock(module_name='artman.pipelines.pipeline_base',
+                                attrs=('EmptyPipeline',))
+        entry_point.name = 'PluginPipeline'
+        with mock.patch.object(pipeline_factory, '_entry_points_loaded',
+                               False), \
+                mock.patch.object(pipeline_factory, 'metadata', None), \
+                mock.patch('pkg_resources.iter_entry_points',
+                           return_value=[entry_point]) as iter_entry_points:
+            cls = pipeline_factory.pipeline_class('PluginPipeline')
+        iter_entry_points.assert_called_once_with(
+            pipeline_factory.ENTRY_POINT_GROUP)
+        assert cls is pipeline_base.EmptyPipeline
+
+    def test_invalid_name(self):
+        with mock.patch.object(pipeline_factory, '_entry_points_loaded',
+                               True):
+            with pytest.raises(ValueError):
+                pipeline_factory.make_pipeline('NoSuchPipeline')
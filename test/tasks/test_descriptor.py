@@ -31,6 +31,33 @@ class PythonDocsConversionTests(unittest.TestCase):
         task.execute(descriptor_set)
         convert_text.assert_called()
 
+    @mock.patch.object(pypandoc, 'convert_text')
+    def test_md2rst_all_batches(self, convert_text):
+        convert_text.side_effect = lambda text, to, format: text + '\n'
+        converted = descriptor_set_tasks.md2rst_all(
+            [' Foo *bar*', ' no markup', ' `baz`', ' Foo *bar*'])
+        assert converted == {
+            ' Foo *bar*': '  Foo *bar*\n',
+            ' no markup': ' no markup',
+            ' `baz`': '  `baz`\n',
+        }
+        assert convert_text.call_count == 1
+
+    @mock.patch.object(pypandoc, 'convert_text')
+    def test_md2rst_all_splits_broken_batch(self, convert_text):
+        def fake_convert(text, to, format):
+            # Swallow everything after an unclosed code block.
+            if '```' in text:
+                return text[:text.index('```')] + '\n'
+            return text + '\n'
+        convert_text.side_effect = fake_convert
+        comments = [' *a*', ' *b*', '```\n *c*', ' *d*']
+        converted = descriptor_set_tasks.md2rst_all(comments)
+        assert converted[' *a*'] == '  *a*\n'
+        assert converted[' *d*'] == '  *d*\n'
+        assert converted['```\n *c*'] == ' \n'
+        assert convert_text.call_count == 5
+
     @unittest.expectedFailure
     def test_valid_rst(self):
         descriptor_set = 'test/tasks/data/test_descriptor/descriptor_set'
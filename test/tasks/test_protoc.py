@@ -16,40 +16,116 @@ from __future__ import absolute_import
 import unittest
 import os
 import shutil
+import subprocess
+import tempfile
 
+from google.protobuf import descriptor_pb2
 import mock
 
 import pytest
 
 from artman.tasks import protoc_tasks
+from artman.utils import file_utils
 from artman.utils import protoc_utils
 
 
+class ProtoDescGenTaskCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp, 'googleapis')
+        self.src_dir = os.path.join(self.root_dir, 'google', 'example', 'v1')
+        self.dep = os.path.join(self.root_dir, 'google', 'dep', 'dep.proto')
+        os.makedirs(self.src_dir)
+        os.makedirs(os.path.dirname(self.dep))
+        with open(os.path.join(self.src_dir, 'example.proto'), 'w') as f:
+            f.write('import "google/dep/dep.proto";\n')
+        with open(self.dep, 'w') as f:
+            f.write('package google.dep;\n')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        self.output_dir = os.path.join(self.tmp, 'output')
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _fake_protoc(self, args):
+        if args[0] == 'mkdir':
+            return
+        desc_set = descriptor_pb2.FileDescriptorSet()
+        desc_set.file.add(name='google/dep/dep.proto')
+        desc_set.file.add(name='google/example/v1/example.proto')
+        desc_set.file.add(name='google/protobuf/empty.proto')
+        with open(args[args.index('-o') + 1], 'wb') as f:
+            f.write(desc_set.SerializeToString())
+
+    def _execute(self):
+        task = protoc_tasks.ProtoDescGenTask()
+        with mock.patch.object(task, 'exec_command') as exec_command, \
+                mock.patch.object(
+                    protoc_utils, 'protoc_header_params',
+                    lambda paths, toolkit: ['--proto_path=' + p for p in paths]):
+            exec_command.side_effect = self._fake_protoc
+            desc = task.execute(
+                [self.src_dir], [self.root_dir], self.output_dir, 'example',
+                'v1', 'google', 'toolkit', self.root_dir,
+                cache_dir=self.cache_dir)
+        protoc_calls = [c for c in exec_command.call_args_list
+                        if c[0][0][0] != 'mkdir']
+        return desc, len(protoc_calls)
+
+    def test_cache_hit(self):
+        desc, protoc_calls = self._execute()
+        assert protoc_calls == 1
+        os.remove(desc)
+        desc, protoc_calls = self._execute()
+        assert protoc_calls == 0
+        assert os.path.isfile(desc)
+
+    def test_changed_import_misses(self):
+        self._execute()
+        with open(self.dep, 'a') as f:
+            f.write('message Dep {}\n')
+        _, protoc_calls = self._execute()
+        assert protoc_calls == 1
+
+    def test_changed_src_misses(self):
+        self._execute()
+        with open(os.path.join(self.src_dir, 'example.proto'), 'a') as f:
+            f.write('message Example {}\n')
+        _, protoc_calls = self._execute()
+        assert protoc_calls == 1
+
+    def test_changed_src_replaces_entry(self):
+        self._execute()
+        with open(os.path.join(self.src_dir, 'example.proto'), 'a') as f:
+            f.write('message Example {}\n')
+        self._execute()
+        entries = [name for _, _, files in os.walk(self.cache_dir)
+                   for name in files]
+        assert sorted(os.path.splitext(name)[1] for name in entries) == [
+            '.desc', '.json']
+
+
 class JavaProtoCopyTaskTests(unittest.TestCase):
-    @mock.patch.object(protoc_tasks.JavaProtoCopyTask, 'exec_command')
-    def test_execute(self, exec_command):
+    @mock.patch.object(file_utils, 'copy_files')
+    def test_execute(self, copy_files):
         src_proto_path = ['test/tasks/data/googleapis/google/pubsub/v1']
         grpc_code_dir = 'grpc_code_dir'
         task = protoc_tasks.JavaProtoCopyTask()
         task.execute(src_proto_path, grpc_code_dir)
-        assert exec_command.call_count == 2
-        expected_cmds = (
-            'mkdir -p grpc_code_dir/src/main/proto/google/pubsub/v1',
-            'cp test/tasks/data/googleapis/google/pubsub/v1/pubsub.proto '
-            + 'grpc_code_dir/src/main/proto/google/pubsub/v1/pubsub.proto',
-        )
-        for call, expected in zip(exec_command.mock_calls, expected_cmds):
-            _, args, _ = call
-            assert ' '.join(args[0]) == expected
-
-    @mock.patch.object(protoc_tasks.JavaProtoCopyTask, 'exec_command')
-    def test_execute_bad_src_path(self, exec_command):
+        copy_files.assert_called_once_with([(
+            'test/tasks/data/googleapis/google/pubsub/v1/pubsub.proto',
+            'grpc_code_dir/src/main/proto/google/pubsub/v1/pubsub.proto',
+        )])
+
+    @mock.patch.object(file_utils, 'copy_files')
+    def test_execute_bad_src_path(self, copy_files):
         src_proto_path = ['test/tasks/data/googleapis/groogle/pubsub/v1']
         grpc_code_dir = 'grpc_code_dir'
         task = protoc_tasks.JavaProtoCopyTask()
         with pytest.raises(ValueError):
             task.execute(src_proto_path, grpc_code_dir)
-        assert exec_command.call_count == 0
+        assert copy_files.call_count == 0
 
 
 class PhpGrpcRenameTaskTests(unittest.TestCase):
@@ -95,6 +171,39 @@ class ProtoCodeGenTaskTests(unittest.TestCase):
 
         assert exec_command.call_count == 2
 
+    @mock.patch('artman.utils.protoc_utils.protoc_header_params',
+                mock.MagicMock(return_value=['protoc_header_params']))
+    def test_execute_go_aggregates_errors(self):
+        src_proto_path = ['test/tasks/data/googleapis/google/go_package_example/v1']
+        task = protoc_tasks.ProtoCodeGenTask()
+
+        def exec_command(args):
+            if any(a.endswith('first.proto') for a in args):
+                raise subprocess.CalledProcessError(1, args)
+        with mock.patch.object(task, 'exec_command') as mock_exec:
+            mock_exec.side_effect = exec_command
+            with pytest.raises(RuntimeError) as excinfo:
+                task.execute('go', src_proto_path, [], 'output_dir',
+                             'api_name', 'v1', 'org_name', 'toolkit_path',
+                             'gapic_yaml', 'root_dir', protoc_jobs=2)
+        # The other package still gets compiled.
+        assert mock_exec.call_count == 2
+        assert 'protoc failed for 1 of 2 packages' in str(excinfo.value)
+
+    @mock.patch.object(protoc_tasks.ProtoCodeGenTask, 'exec_command')
+    @mock.patch('artman.utils.protoc_utils.protoc_header_params',
+                mock.MagicMock(return_value=['protoc_header_params']))
+    def test_execute_go_serial(self, exec_command):
+        src_proto_path = ['test/tasks/data/googleapis/google/go_package_example/v1']
+        task = protoc_tasks.ProtoCodeGenTask()
+        task.execute('go', src_proto_path, [], 'output_dir', 'api_name', 'v1',
+                     'org_name', 'toolkit_path', 'gapic_yaml', 'root_dir',
+                     protoc_jobs=1)
+        # Packages are compiled in a stable order.
+        protos = [os.path.basename(call[0][0][-1])
+                  for call in exec_command.call_args_list]
+        assert protos == ['first.proto', 'second.proto']
+
 
     @mock.patch.object(protoc_tasks.ProtoCodeGenTask, 'exec_command')
     @mock.patch('artman.utils.protoc_utils.protoc_header_params', 
@@ -262,3 +371,36 @@ def test_php_proto_rename():
     with open(os.path.join(path, 'ExampleGrpcClientInitial.php')) as init_file:
         initial = init_file.read()
     assert protoc_utils.php_proto_rename(initial) == expected
+
+
+def test_find_protos_exclusion_prunes_walk():
+    excluded = os.path.abspath('test/fake-repos/fake-proto/excluded')
+    with mock.patch.object(os, 'scandir', wraps=os.scandir) as scandir:
+        protos = list(protoc_utils.find_protos(
+            ['test/fake-repos/fake-proto'], [excluded]))
+    assert protos == ['test/fake-repos/fake-proto/fake.proto']
+    assert scandir.call_count == 1
+
+
+def test_find_protos_exclusion_matches_whole_components():
+    protos = list(protoc_utils.find_protos(
+        ['test/fake-repos/fake-proto'],
+        ['test/fake-repos/fake-proto/exclude']))
+    assert protos == [
+        'test/fake-repos/fake-proto/fake.proto',
+        'test/fake-repos/fake-proto/excluded/excluded.proto',
+    ]
+
+
+def test_find_protos_multiple_roots():
+    src_proto_paths = [
+        'test/fake-repos/fake-proto/excluded',
+        'test/fake-repos/fake-proto/fake.proto',
+        'test/fake-repos/fake-proto',
+    ]
+    assert list(protoc_utils.find_protos(src_proto_paths, [])) == [
+        'test/fake-repos/fake-proto/excluded/excluded.proto',
+        'test/fake-repos/fake-proto/fake.proto',
+        'test/fake-repos/fake-proto/fake.proto',
+        'test/fake-repos/fake-proto/excluded/excluded.proto',
+    ]
@@ -0,0 +1,198 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import mock
+import pytest
+
+from artman.tasks import task_base
+
+
+class _GenTask(task_base.TaskBase):
+    runs = 0
+
+    @task_base.incremental('src')
+    def execute(self, src, output_dir, flavor='plain'):
+        type(self).runs += 1
+        out = os.path.join(output_dir, 'gen')
+        if not os.path.isdir(out):
+            os.makedirs(out)
+        with open(os.path.join(out, 'out.txt'), 'w') as f:
+            with open(src) as s:
+                f.write(flavor + s.read())
+        return out
+
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, 'src.txt')
+        self.output_dir = os.path.join(self.tmp, 'output')
+        self._write(self.src, 'v1')
+        _GenTask.runs = 0
+
+    def tearDown(self):
+        task_base._pending_runs.clear()
+        shutil.rmtree(self.tmp)
+
+    def _write(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _run(self, incremental=True, flavor='plain'):
+        inject = {'output_dir': self.output_dir, 'incremental': incremental}
+        task = _GenTask('gen', inject=inject)
+        result = task.execute(
+            src=self.src, output_dir=self.output_dir, flavor=flavor)
+        task_base.RecordIncrementalRunsTask(
+            'record', inject=inject).execute(self.output_dir)
+        return result
+
+    def test_skips_unchanged(self):
+        out = self._run()
+        assert self._run() == out
+        assert _GenTask.runs == 1
+        assert os.listdir(os.path.join(
+            self.output_dir, task_base.INCREMENTAL_DIR))
+
+    def test_not_incremental(self):
+        self._run(incremental=False)
+        self._run(incremental=False)
+        assert _GenTask.runs == 2
+
+    def test_changed_input_file(self):
+        self._run()
+        self._write(self.src, 'v2')
+        self._run()
+        assert _GenTask.runs == 2
+
+    def test_changed_argument(self):
+        self._run()
+        self._run(flavor='fancy')
+        assert _GenTask.runs == 2
+
+    def test_removed_output(self):
+        out = self._run()
+        shutil.rmtree(out)
+        self._run()
+        assert _GenTask.runs == 2
+
+    def test_changed_output(self):
+        out = self._run()
+        self._write(os.path.join(out, 'extra.txt'), 'stray')
+        self._run()
+        assert _GenTask.runs == 2
+
+    def test_output_changed_before_recording(self):
+        # A later task (e.g. a formatter) changing the output before the
+        # pipeline ends does not invalidate the run.
+        inject = {'output_dir': self.output_dir, 'incremental': True}
+        out = _GenTask('gen', inject=inject).execute(
+            src=self.src, output_dir=self.output_dir)
+        self._write(os.path.join(out, 'formatted.txt'), 'formatted')
+        task_base.record_incremental_runs(self.output_dir)
+        self._run()
+        assert _GenTask.runs == 1
+
+    def test_input_changed_before_recording(self):
+        # The inputs the task ran with are recorded, not those at the end
+        # of the pipeline.
+        inject = {'output_dir': self.output_dir, 'incremental': True}
+        _GenTask('gen', inject=inject).execute(
+            src=self.src, output_dir=self.output_dir)
+        self._write(self.src, 'v2')
+        task_base.record_incremental_runs(self.output_dir)
+        self._run()
+        assert _GenTask.runs == 2
+
+    def test_scratch_dir(self):
+        # Each run reads its input from a new scratch directory.
+        for _ in range(2):
+            scratch_dir = tempfile.mkdtemp(dir=self.tmp)
+            src = os.path.join(scratch_dir, 'src.txt')
+            self._write(src, 'v1')
+            inject = {'output_dir': self.output_dir, 'incremental': True,
+                      'scratch_dir': scratch_dir}
+            _GenTask('gen', inject=inject).execute(
+                src=src, output_dir=self.output_dir)
+            task_base.record_incremental_runs(self.output_dir)
+        assert _GenTask.runs == 1
+        assert len(os.listdir(os.path.join(
+            self.output_dir, task_base.INCREMENTAL_DIR))) == 1
+
+    def test_unrecorded_run(self):
+        # Without the record task, e.g. because the pipeline failed, the next
+        # run executes the task again.
+        inject = {'output_dir': self.output_dir, 'incremental': True}
+        _GenTask('gen', inject=inject).execute(
+            src=self.src, output_dir=self.output_dir)
+        task_base._pending_runs.clear()
+        self._run()
+        assert _GenTask.runs == 2
+
+
+class ExecCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_output(self):
+        task = task_base.EmptyTask('task')
+        output = task.exec_command(
+            ['sh', '-c', 'echo out; echo err >&2'], cwd=self.tmp)
+        assert output == 'out\nerr\n'
+
+    def test_cwd(self):
+        task = task_base.EmptyTask('task')
+        assert task.exec_command(['pwd'], cwd=self.tmp).strip() == (
+            os.path.realpath(self.tmp))
+
+    def test_failure_keeps_tail(self):
+        task = task_base.EmptyTask('task')
+        with mock.patch.object(task_base, 'OUTPUT_TAIL_LINES', 2):
+            with pytest.raises(subprocess.CalledProcessError) as excinfo:
+                task.exec_command(
+                    ['sh', '-c', 'echo 1; echo 2; echo 3; exit 3'])
+        assert excinfo.value.returncode == 3
+        assert excinfo.value.output == b'2\n3\n'
+
+    def test_failure_tail_logged_once(self):
+        task = task_base.EmptyTask('task')
+        args = ['sh', '-c', 'echo 1; exit 3']
+        for output_enabled, errors in ((True, 0), (False, 1)):
+            with mock.patch.object(task_base.output_logger, 'isEnabledFor',
+                                   return_value=output_enabled), \
+                    mock.patch.object(task, 'log') as log:
+                with pytest.raises(subprocess.CalledProcessError):
+                    task.exec_command(args)
+            assert [c[1]['level'] for c in log.call_args_list].count(
+                logging.ERROR) == errors
+
+    def test_task_log_dir(self):
+        log_dir = os.path.join(self.tmp, 'logs')
+        task = task_base.EmptyTask('task', inject={'task_log_dir': log_dir})
+        task.exec_command(['echo', 'first'])
+        task.exec_command(['echo', 'second'])
+        with open(os.path.join(log_dir, 'task.log')) as f:
+            assert f.read() == (
+                '$ echo first\nfirst\n$ echo second\nsecond\n')
@@ -15,6 +15,8 @@
 import io
 import mock
 import os
+import shutil
+import tempfile
 import unittest
 
 from artman.tasks import python_grpc_tasks
@@ -33,20 +35,19 @@ class PythonPackageChangeTest(unittest.TestCase):
         'import "google/common/common_proto.proto";\n',
         'Some other text referencing to google.service.v1\n']
 
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.proto = os.path.join(self.tmp, 'a.proto')
+        with io.open(self.proto, 'w', encoding='UTF-8') as f:
+            f.write(u''.join(self._PROTO_FILE))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
     def test__extract_base_dirs(self):
-        mock_proto = mock.mock_open()
-        mock_proto.return_value.__iter__ = lambda _: iter(self._PROTO_FILE)
-        with mock.patch.object(io, 'open', mock_proto):
-            base_dirs = self._TASK._extract_base_dirs(
-                os.path.join('a', 'test', 'path', 'to', 'google', 'service',
-                             'v1', 'a.proto'))
-            repeated_base_dirs = self._TASK._extract_base_dirs(
-                os.path.join('home', 'foo', 'workspaces', 'google', 'some',
-                             'v1', 'googleapis', 'google', 'service', 'v1',
-                             'a.proto'))
+        base_dirs = self._TASK._extract_base_dirs(self.proto)
         expected = os.path.join('google', 'service', 'v1')
         self.assertEqual(base_dirs, expected)
-        self.assertEqual(repeated_base_dirs, expected)
 
     def test__transfom(self):
         # Simple package transformations with arbitrary separator
@@ -80,16 +81,112 @@ class PythonPackageChangeTest(unittest.TestCase):
             'my_custom/path')
 
     def test__copy_proto(self):
-        mock_proto = mock.mock_open()
-        mock_proto.return_value.__iter__ = lambda _: iter(self._PROTO_FILE)
-        with mock.patch.object(io, 'open', mock_proto):
-            self._TASK._copy_proto('foo', 'bar', ['google.common'])
-        expected_writes = [
-            mock.call('# Comment line\n'),
-            mock.call('package google.service.v1;\n'),
-            mock.call('import "google/service_v1/proto/a.proto";\n'),
-            mock.call('import "google/cloud/otherapi_v3/proto/b.proto";\n'),
-            mock.call('import "google/common/common_proto.proto";\n'),
-            mock.call('Some other text referencing to google.service.v1\n')]
-
-        mock_proto().write.assert_has_calls(expected_writes)
+        dest = os.path.join(self.tmp, 'b.proto')
+        self._TASK._copy_proto(self.proto, dest, ['google.common'])
+        with io.open(dest, encoding='UTF-8') as f:
+            self.assertEqual(f.readlines(), [
+                '# Comment line\n',
+                'package google.service.v1;\n',
+                'import "google/service_v1/proto/a.proto";\n',
+                'import "google/cloud/otherapi_v3/proto/b.proto";\n',
+                'import "google/common/common_proto.proto";\n',
+                'Some other text referencing to google.service.v1\n'])
+
+    def test__copy_proto_unchanged_imports(self):
+        dest = os.path.join(self.tmp, 'b.proto')
+        with mock.patch.object(python_grpc_tasks.file_utils,
+                               'link_file') as link_file:
+            self._TASK._copy_proto(self.proto, dest, ['google'], link=True)
+        link_file.assert_called_once_with(self.proto, dest)
+
+    def test__copy_proto_unchanged_imports_copies(self):
+        dest = os.path.join(self.tmp, 'b.proto')
+        self._TASK._copy_proto(self.proto, dest, ['google'])
+        self.assertFalse(os.path.samefile(self.proto, dest))
+        with io.open(dest, encoding='UTF-8') as f:
+            self.assertEqual(f.read(), u''.join(self._PROTO_FILE))
+
+    def test_execute_does_not_link_into_cache(self):
+        src_dir = os.path.join(self.tmp, 'src')
+        os.makedirs(src_dir)
+        with io.open(os.path.join(src_dir, 'c.proto'), 'w') as f:
+            f.write(u'package google.common;\n')
+        task = python_grpc_tasks.PythonChangePackageTask('test')
+        src_path, _ = task.execute(
+            [src_dir], [src_dir], 'google', cache_dir=self.tmp)
+        self.assertFalse(os.path.samefile(
+            os.path.join(src_dir, 'c.proto'),
+            os.path.join(src_path[0], 'c.proto')))
+
+    def test_execute_reuses_tree(self):
+        src_dir = os.path.join(self.tmp, 'src')
+        os.makedirs(src_dir)
+        shutil.move(self.proto, os.path.join(src_dir, 'a.proto'))
+        cache_dir = os.path.join(self.tmp, 'cache')
+        task = python_grpc_tasks.PythonChangePackageTask('test')
+        src_path, import_path = task.execute(
+            [src_dir], [src_dir], 'google-cloud', cache_dir=cache_dir)
+        self.assertEqual(len(src_path), 1)
+        self.assertTrue(src_path[0].endswith(
+            os.path.join('proto', 'google', 'cloud', 'service_v1', 'proto')))
+        self.assertTrue(os.path.isfile(os.path.join(src_path[0], 'a.proto')))
+
+        with mock.patch.object(task, '_copy_and_transform_protos') as copy:
+            self.assertEqual(
+                task.execute([src_dir], [src_dir], 'google-cloud',
+                             cache_dir=cache_dir),
+                (src_path, import_path))
+        copy.assert_not_called()
+
+        # Other transform rules build another tree.
+        other_src_path, _ = task.execute(
+            [src_dir], [src_dir], 'google', cache_dir=cache_dir)
+        self.assertNotEqual(other_src_path, src_path)
+
+    def test_execute_replaces_superseded_tree(self):
+        src_dir = os.path.join(self.tmp, 'src')
+        os.makedirs(src_dir)
+        shutil.move(self.proto, os.path.join(src_dir, 'a.proto'))
+        cache_dir = os.path.join(self.tmp, 'cache')
+        task = python_grpc_tasks.PythonChangePackageTask('test')
+        src_path, _ = task.execute(
+            [src_dir], [self.tmp], 'google-cloud', cache_dir=cache_dir)
+
+        # Files outside the source protos and their imports do not matter.
+        with io.open(os.path.join(self.tmp, 'unrelated.txt'), 'w') as f:
+            f.write(u'unrelated')
+        self.assertEqual(task.execute(
+            [src_dir], [self.tmp], 'google-cloud', cache_dir=cache_dir)[0],
+            src_path)
+
+        # A changed source proto builds a new tree, replacing the old one.
+        with io.open(os.path.join(src_dir, 'a.proto'), 'a') as f:
+            f.write(u'// Changed\n')
+        new_src_path, _ = task.execute(
+            [src_dir], [self.tmp], 'google-cloud', cache_dir=cache_dir)
+        self.assertNotEqual(new_src_path, src_path)
+        self.assertTrue(os.path.isdir(new_src_path[0]))
+        self.assertFalse(os.path.exists(src_path[0]))
+
+    def test__import_closure(self):
+        root = os.path.join(self.tmp, 'root')
+        protos = {
+            'google/service/v1/a.proto': 'import "google/other/v1/b.proto";\n'
+                                         'import "google/protobuf/any.proto";\n',
+            'google/other/v1/b.proto': 'import "google/type/c.proto";\n'
+                                       'import "google/service/v1/a.proto";\n',
+            'google/type/c.proto': '',
+            'google/unused/d.proto': '',
+        }
+        for name, content in protos.items():
+            path = os.path.join(root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with io.open(path, 'w', encoding='UTF-8') as f:
+                f.write(u'syntax = "proto3";\n' + content)
+        src = os.path.join(root, 'google/service/v1/a.proto')
+        closure = self._TASK._import_closure([src], [root])
+        self.assertEqual(closure, [
+            os.path.join(root, 'google/other/v1/b.proto'),
+            os.path.join(root, 'google/type/c.proto'),
+        ])
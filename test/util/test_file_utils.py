@@ -0,0 +1,126 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import mock
+
+from artman.utils import file_utils
+
+
+class FileUtilsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, path, content):
+        path = os.path.join(self.tmp, path)
+        file_utils.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _read(self, path):
+        with open(os.path.join(self.tmp, path)) as f:
+            return f.read()
+
+    def test_copy_file(self):
+        src = self._write('src.sh', 'x' * 100000)
+        os.chmod(src, 0o755)
+        dest = self._write('dest.sh', 'this is overwritten' * 10000)
+        file_utils.copy_file(src, dest)
+        assert self._read('dest.sh') == 'x' * 100000
+        assert stat.S_IMODE(os.stat(dest).st_mode) == 0o755
+
+    def test_copy_file_without_kernel_copy(self):
+        src = self._write('src', 'content')
+        dest = os.path.join(self.tmp, 'dest')
+        unsupported = OSError(errno.EXDEV, 'cross-device link')
+        with mock.patch.object(os, 'copy_file_range', create=True,
+                               side_effect=unsupported), \
+                mock.patch.object(os, 'sendfile', create=True,
+                                  side_effect=unsupported):
+            file_utils.copy_file(src, dest)
+        assert self._read('dest') == 'content'
+
+    def test_link_file(self):
+        src = self._write('src', 'content')
+        dest = self._write('dest', 'this is replaced')
+        file_utils.link_file(src, dest)
+        assert self._read('dest') == 'content'
+        assert os.path.samefile(src, dest)
+
+    def test_link_file_across_devices(self):
+        src = self._write('src', 'content')
+        dest = os.path.join(self.tmp, 'dest')
+        with mock.patch.object(os, 'link', side_effect=OSError(
+                errno.EXDEV, 'cross-device link')):
+            file_utils.link_file(src, dest)
+        assert self._read('dest') == 'content'
+        assert not os.path.samefile(src, dest)
+
+    def test_copy_files(self):
+        pairs = []
+        for i in range(file_utils.PARALLEL_THRESHOLD + 1):
+            src = self._write('src/%d.proto' % i, str(i))
+            pairs.append((src, os.path.join(
+                self.tmp, 'dest', str(i % 3), '%d.proto' % i)))
+        file_utils.copy_files(pairs)
+        for i in range(file_utils.PARALLEL_THRESHOLD + 1):
+            assert self._read('dest/%d/%d.proto' % (i % 3, i)) == str(i)
+
+    def test_copy_tree(self):
+        self._write('src/pkg/a.go', 'a')
+        self._write('src/pkg/sub/b.go', 'b')
+        self._write('dest/pkg/a.go', 'old')
+        self._write('dest/pkg/kept.go', 'kept')
+        file_utils.copy_tree(os.path.join(self.tmp, 'src', 'pkg'),
+                             os.path.join(self.tmp, 'dest'))
+        assert self._read('dest/pkg/a.go') == 'a'
+        assert self._read('dest/pkg/sub/b.go') == 'b'
+        assert self._read('dest/pkg/kept.go') == 'kept'
+
+    def test_copy_tree_symlinks(self):
+        self._write('src/pkg/sub/b.go', 'b')
+        os.symlink('sub', os.path.join(self.tmp, 'src', 'pkg', 'linked'))
+        os.symlink(os.path.join('sub', 'b.go'),
+                   os.path.join(self.tmp, 'src', 'pkg', 'c.go'))
+        self._write('dest/pkg/c.go', 'old')
+        file_utils.copy_tree(os.path.join(self.tmp, 'src', 'pkg'),
+                             os.path.join(self.tmp, 'dest'))
+        assert os.readlink(os.path.join(
+            self.tmp, 'dest', 'pkg', 'linked')) == 'sub'
+        assert os.readlink(os.path.join(
+            self.tmp, 'dest', 'pkg', 'c.go')) == os.path.join('sub', 'b.go')
+        assert self._read('dest/pkg/linked/b.go') == 'b'
+
+    def test_copy_tree_file(self):
+        src = self._write('src/a.go', 'a')
+        file_utils.copy_tree(src, os.path.join(self.tmp, 'dest'))
+        assert self._read('dest/a.go') == 'a'
+
+    def test_move(self):
+        self._write('src/pkg/a.php', 'a')
+        file_utils.move(os.path.join(self.tmp, 'src', 'pkg'),
+                        os.path.join(self.tmp, 'dest'))
+        assert self._read('dest/a.php') == 'a'
+        assert not os.path.exists(os.path.join(self.tmp, 'src', 'pkg'))
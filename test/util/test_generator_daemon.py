@@ -0,0 +1,160 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+from artman.utils import generator_daemon
+from artman.utils import task_utils
+
+
+class GeneratorDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.jar = os.path.join(self.tmp, 'gapic.jar')
+        open(self.jar, 'w').close()
+        generator_daemon._ports.clear()
+        libs_dir = os.path.join(self.tmp, 'build', 'libs')
+        os.makedirs(libs_dir)
+        open(os.path.join(
+            libs_dir, 'gapic-generator-latest-fatjar.jar'), 'w').close()
+
+    def tearDown(self):
+        generator_daemon._nailgun_jar = None
+        generator_daemon._ports.clear()
+        for _, lock_file in getattr(
+                generator_daemon._claims, 'slots', {}).values():
+            lock_file.close()
+        generator_daemon._claims.slots = {}
+        shutil.rmtree(self.tmp)
+
+    def test_disabled(self):
+        assert generator_daemon.command(self.jar, 'Main', ['a']) is None
+
+    @mock.patch('shutil.which', mock.Mock(return_value='/usr/bin/ng'))
+    @mock.patch.object(generator_daemon, '_ensure_server',
+                       mock.Mock(return_value=1234))
+    def test_gapic_gen_task_uses_daemon(self):
+        generator_daemon.enable('nailgun.jar', self.tmp)
+        cmd = task_utils.gapic_gen_task(self.tmp, ['GAPIC_CODE'])
+        assert cmd == ['ng', '--nailgun-port', '1234',
+                       'com.google.api.codegen.GeneratorMain', 'GAPIC_CODE']
+
+    @mock.patch('shutil.which', mock.Mock(return_value='/usr/bin/ng'))
+    @mock.patch.object(generator_daemon, '_ensure_server',
+                       mock.Mock(return_value=None))
+    def test_falls_back_to_java(self):
+        generator_daemon.enable('nailgun.jar', self.tmp)
+        cmd = task_utils.gapic_gen_task(self.tmp, ['GAPIC_CODE'])
+        assert cmd[0] == 'java'
+
+    @mock.patch('subprocess.Popen')
+    def test_reuses_running_server(self, popen):
+        generator_daemon.enable('nailgun.jar', self.tmp)
+        popen.return_value = mock.Mock(pid=4321, **{'poll.return_value': None})
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        try:
+            port = server.getsockname()[1]
+            with mock.patch.object(generator_daemon, '_free_port',
+                                   return_value=port), \
+                    mock.patch.object(generator_daemon, '_server_class',
+                                      return_value='NGServer'):
+                assert generator_daemon._ensure_server(
+                    self.jar, self.tmp, 'key-0') == port
+            assert popen.call_count == 1
+            assert popen.call_args[1]['cwd'] == self.tmp
+            # A later run finds the server through the state file, once the
+            # watchdog is known to be ours.
+            with mock.patch.object(generator_daemon, '_is_ours',
+                                   return_value=True) as is_ours:
+                assert generator_daemon._ensure_server(
+                    self.jar, self.tmp, 'key-0') == port
+            assert is_ours.call_args[0][0] == {'port': port, 'pid': 4321}
+            assert popen.call_count == 1
+        finally:
+            server.close()
+
+    def test_is_ours(self):
+        state_file = os.path.join(self.tmp, 'key-0.json')
+        watchdog = subprocess.Popen(
+            [sys.executable, '-c', 'import time; time.sleep(30)', state_file])
+        try:
+            state = {'port': 1234, 'pid': watchdog.pid}
+            # Wait for the watchdog to have replaced the forked test process.
+            deadline = time.time() + 10
+            while (not generator_daemon._is_ours(state, state_file) and
+                   time.time() < deadline):
+                time.sleep(0.01)
+            if os.path.isdir('/proc'):
+                assert not generator_daemon._is_ours(
+                    state, os.path.join(self.tmp, 'other.json'))
+            assert generator_daemon._is_ours(state, state_file)
+        finally:
+            watchdog.kill()
+            watchdog.wait()
+        assert not generator_daemon._is_ours(state, state_file)
+
+    def test_concurrent_tasks_get_distinct_slots(self):
+        generator_daemon.enable('nailgun.jar', self.tmp)
+        slots = []
+        thread = threading.Thread(
+            target=lambda: slots.append(generator_daemon._claim_slot('key')))
+        slots.append(generator_daemon._claim_slot('key'))
+        thread.start()
+        thread.join()
+        assert slots == [0, 1]
+        assert generator_daemon._claim_slot('key') == 0
+
+    def test_stop_all(self):
+        generator_daemon.enable('nailgun.jar', self.tmp)
+        state_dir = generator_daemon.state_dir(self.tmp)
+        os.makedirs(state_dir)
+        for name, pid in (('ours-0.json', 11), ('stale-0.json', 12)):
+            with io.open(os.path.join(state_dir, name), 'w') as f:
+                f.write(u'{"port": 1234, "pid": %d}' % pid)
+        with mock.patch.object(generator_daemon, '_is_ours',
+                               side_effect=lambda state, _: state['pid'] == 11), \
+                mock.patch('os.kill') as kill:
+            assert generator_daemon.stop_all(self.tmp) == 1
+        kill.assert_called_once_with(11, signal.SIGTERM)
+        assert os.listdir(state_dir) == []
+
+    @mock.patch.object(generator_daemon, '_WATCH_INTERVAL_SECS', 0.05)
+    def test_watch_stops_idle_server(self):
+        state_file = os.path.join(self.tmp, 'key-0.json')
+        with io.open(state_file, 'w') as f:
+            f.write(u'{"port": 1234, "pid": %d}' % os.getpid())
+        start = time.time()
+        generator_daemon._watch(
+            state_file, 0.1,
+            [sys.executable, '-c', 'import time; time.sleep(30)'])
+        assert time.time() - start < 10
+        assert not os.path.exists(state_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from artman.utils import proto_index
+
+_PROTO = u'''syntax = "proto3";
+
+package google.example.v1;
+
+import "google/api/annotations.proto";
+import public "google/example/v1/common.proto";
+
+option go_package = "google.golang.org/genproto/example/v1;example";
+option java_multiple_files = true;
+option (google.api.resource_definition) = {
+  type: "example.googleapis.com/Thing"
+};
+'''
+
+
+class ProtoIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.proto = os.path.join(self.tmp, 'example.proto')
+        with io.open(self.proto, 'w', encoding='UTF-8') as f:
+            f.write(_PROTO)
+        proto_index._index_path = None
+        proto_index._entries = None
+
+    def tearDown(self):
+        proto_index._index_path = None
+        proto_index._entries = None
+        shutil.rmtree(self.tmp)
+
+    def test_get(self):
+        info = proto_index.get(self.proto)
+        assert info.package == 'google.example.v1'
+        assert info.go_package == 'google.golang.org/genproto/example/v1'
+        assert info.imports == ['google/api/annotations.proto',
+                                'google/example/v1/common.proto']
+        assert info.public_imports == ['google/example/v1/common.proto']
+        assert info.options['java_multiple_files'] == 'true'
+
+    def test_parses_once(self):
+        with mock.patch.object(proto_index, '_parse',
+                               wraps=proto_index._parse) as parse:
+            proto_index.get(self.proto)
+            proto_index.get(self.proto)
+            assert parse.call_count == 1
+            with io.open(self.proto, 'a', encoding='UTF-8') as f:
+                f.write(u'// A change of size.\n')
+            proto_index.get(self.proto)
+            assert parse.call_count == 2
+
+    def test_persisted(self):
+        cache_dir = os.path.join(self.tmp, 'cache')
+        proto_index.enable(cache_dir)
+        proto_index.get(self.proto)
+        proto_index.save()
+        assert os.path.isfile(os.path.join(cache_dir, 'proto-index.json'))
+
+        proto_index.enable(cache_dir)
+        with mock.patch.object(proto_index, '_parse') as parse:
+            info = proto_index.get(self.proto)
+        assert parse.call_count == 0
+        assert info.package == 'google.example.v1'
@@ -0,0 +1,124 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+
+import mock
+import pytest
+
+from artman.tasks import task_base
+from artman.utils import protoc_runner
+
+
+class ProtocRunnerTest(unittest.TestCase):
+    ARGS = protoc_runner.GRPC_TOOLS_COMMAND + ['-Iroot', 'a.proto']
+
+    def setUp(self):
+        self.task = task_base.EmptyTask('task')
+        # A stand-in for the grpc_tools package.
+        self.protoc = types.ModuleType('grpc_tools.protoc')
+        self.protoc.__file__ = os.path.join('/grpc_tools', 'protoc.py')
+        self.protoc.main = mock.Mock(return_value=0)
+        grpc_tools = types.ModuleType('grpc_tools')
+        grpc_tools.protoc = self.protoc
+        patchers = [
+            mock.patch.dict(sys.modules, {'grpc_tools': grpc_tools,
+                                          'grpc_tools.protoc': self.protoc}),
+            mock.patch.object(protoc_runner, '_has_grpc_tools',
+                              return_value=True),
+            mock.patch.object(protoc_runner.threading, 'active_count',
+                              return_value=1),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_get(self):
+        assert isinstance(protoc_runner.get(self.ARGS),
+                          protoc_runner.InProcessProtocRunner)
+        assert isinstance(protoc_runner.get(['protoc-3.12.2', 'a.proto']),
+                          protoc_runner.SubprocessProtocRunner)
+        with mock.patch.object(protoc_runner, '_has_grpc_tools',
+                               return_value=False):
+            assert isinstance(protoc_runner.get(self.ARGS),
+                              protoc_runner.SubprocessProtocRunner)
+
+    def test_get_with_other_threads(self):
+        # Their standard error would be captured along with protoc's.
+        with mock.patch.object(protoc_runner.threading, 'active_count',
+                               return_value=2):
+            assert isinstance(protoc_runner.get(self.ARGS),
+                              protoc_runner.SubprocessProtocRunner)
+
+    def test_run_in_process(self):
+        with mock.patch.object(self.task, 'exec_command') as exec_command:
+            protoc_runner.run(self.task, self.ARGS)
+        exec_command.assert_not_called()
+        self.protoc.main.assert_called_once_with([
+            'grpc_tools.protoc', '-Iroot', 'a.proto',
+            '-I' + os.path.join('/grpc_tools', '_proto')])
+
+    def test_run_in_process_failure(self):
+        def main(argv):
+            os.write(2, b'a.proto: File not found.\n')
+            return 1
+
+        self.protoc.main.side_effect = main
+        with mock.patch.object(self.task, 'log') as log:
+            with pytest.raises(subprocess.CalledProcessError) as excinfo:
+                protoc_runner.run(self.task, self.ARGS)
+        assert excinfo.value.returncode == 1
+        assert excinfo.value.output == b'a.proto: File not found.\n'
+        assert 'a.proto: File not found.\n' in [
+            c[0][0] for c in log.call_args_list]
+
+    def test_run_in_process_task_log(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        task = task_base.EmptyTask('task', inject={'task_log_dir': log_dir})
+        self.protoc.main.side_effect = lambda argv: os.write(2, b'warning\n') and 0
+        protoc_runner.run(task, self.ARGS)
+        with open(os.path.join(log_dir, 'task.log')) as f:
+            assert f.read() == '$ %s\nwarning\n' % ' '.join(self.ARGS)
+
+    def test_redirect_stderr_keeps_log_records(self):
+        stream = io.open(2, 'w', closefd=False)
+        self.addCleanup(stream.close)
+        handler = logging.StreamHandler(stream)
+        logger = logging.getLogger('artman.test_protoc_runner')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        with tempfile.TemporaryFile() as output:
+            with protoc_runner._redirect_stderr(output):
+                assert handler.stream is not stream
+                logger.error('not protoc output')
+                os.write(2, b'protoc output\n')
+            output.seek(0)
+            assert output.read() == b'protoc output\n'
+        assert handler.stream is stream
+
+    def test_run_subprocess(self):
+        args = ['protoc-3.12.2', 'a.proto']
+        with mock.patch.object(self.task, 'exec_command') as exec_command:
+            protoc_runner.run(self.task, args)
+        exec_command.assert_called_once_with(args)
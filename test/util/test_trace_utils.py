@@ -0,0 +1,69 @@
+# Copyright 2020 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from taskflow import engines
+from taskflow.patterns import linear_flow
+
+from artman.tasks import task_base
+from artman.utils import trace_utils
+
+
+class _EchoTask(task_base.TaskBase):
+    def execute(self):
+        self.exec_command(['echo', 'hello'])
+
+
+class TraceUtilsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.trace = os.path.join(self.tmp, 'trace.json')
+
+    def tearDown(self):
+        trace_utils._events = None
+        trace_utils._thread_names.clear()
+        shutil.rmtree(self.tmp)
+
+    def _read_events(self):
+        with open(self.trace) as f:
+            return json.load(f)['traceEvents']
+
+    def test_disabled(self):
+        with trace_utils.span('load', 'config'):
+            pass
+        trace_utils.write(self.trace)
+        assert self._read_events() == []
+
+    def test_task_and_command_spans(self):
+        trace_utils.enable()
+        flow = linear_flow.Flow('flow').add(_EchoTask('echo-task'))
+        engines.load(flow).run()
+        trace_utils.write(self.trace)
+
+        spans = {e['name']: e for e in self._read_events() if e['ph'] == 'X'}
+        task, command = spans['echo-task'], spans['echo']
+        assert task['cat'] == 'task'
+        assert command['cat'] == 'command'
+        assert command['args'] == {'args': 'echo hello'}
+        assert task['ts'] <= command['ts']
+        assert (command['ts'] + command['dur'] <=
+                task['ts'] + task['dur'])
+        names = [e for e in self._read_events() if e['ph'] == 'M']
+        assert names[0]['tid'] == task['tid']